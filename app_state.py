@@ -19,19 +19,25 @@ app_state = {
 # Maximum number of recent jobs to store
 MAX_RECENT_JOBS = 100
 
-def update_state(jobs_found=None, new_jobs=None):
+def restore_recent_jobs(jobs):
+    """Seed the recent jobs list with jobs stored before a restart"""
+    if jobs and not app_state["recent_jobs"]:
+        app_state["recent_jobs"] = jobs[:MAX_RECENT_JOBS]
+
+def update_state(jobs_found=None, new_jobs=None, next_check_seconds=CHECK_INTERVAL):
     """Update the application state
     
     Args:
         jobs_found (int): Number of new jobs found in this check
         new_jobs (list): List of job dictionaries found in this check
+        next_check_seconds (float): Seconds until the next check is scheduled
     """
     if jobs_found is not None:
         app_state["jobs_found"] += jobs_found
     
     # Update timestamp info
     app_state["last_check"] = datetime.datetime.now()
-    app_state["next_check"] = datetime.datetime.now() + datetime.timedelta(seconds=CHECK_INTERVAL)
+    app_state["next_check"] = datetime.datetime.now() + datetime.timedelta(seconds=next_check_seconds)
     
     # Store recent jobs data if provided
     if new_jobs:
@@ -45,9 +51,9 @@ def update_state(jobs_found=None, new_jobs=None):
         # Update statistics
         for job in new_jobs:
             try:
-                # Update keyword stats
-                keyword = job.get('keyword', 'unknown')
-                app_state["keyword_stats"][keyword] += 1
+                # Update keyword stats for every keyword the job matched
+                for keyword in job.get('keywords', [job.get('keyword', 'unknown')]):
+                    app_state["keyword_stats"][keyword] += 1
                 
                 # Update company stats
                 company = job.get('company', 'Unknown Company')
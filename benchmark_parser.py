@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Parity check and micro-benchmark for the HTML parser backends.
+Runs every backend in job_parser over saved LinkedIn result pages, verifies
+they extract identical job cards and reports the average parse time.
+
+Usage:
+    python benchmark_parser.py page1.html page2.html ...
+    python benchmark_parser.py            (uses a generated sample page)
+"""
+
+import sys
+import timeit
+from job_parser import PARSERS, FAST_TREE_BUILDER
+
+SAMPLE_CARD = """<li>
+  <div class="base-card relative w-full hover:no-underline base-search-card job-search-card" data-entity-urn="urn:li:jobPosting:{job_id}">
+    <a class="base-card__full-link absolute top-0 right-0 bottom-0 left-0 p-0 z-[2]" href="https://www.linkedin.com/jobs/view/software-engineer-at-acme-{job_id}?position={position}&amp;pageNum=0">
+      <span class="sr-only">Software Engineer &amp; QA {position}</span>
+    </a>
+    <div class="base-search-card__info">
+      <h3 class="base-search-card__title">Software Engineer &amp; QA {position}</h3>
+      <h4 class="base-search-card__subtitle"><a class="hidden-nested-link" href="https://www.linkedin.com/company/acme">Acme {position}</a></h4>
+      <div class="base-search-card__metadata">
+        <span class="job-search-card__location">Remote, United States</span>
+        <time class="job-search-card__listdate" datetime="2025-04-01">1 day ago</time>
+      </div>
+    </div>
+  </div>
+</li>
+"""
+
+def build_sample_page(card_count=25):
+    """Build a results page shaped like LinkedIn's search markup"""
+    cards = "".join(SAMPLE_CARD.format(job_id=4170000000 + i, position=i) for i in range(card_count))
+    return f"<html><head><title>Jobs</title></head><body><ul class=\"jobs-search__results-list\">{cards}</ul></body></html>"
+
+def expected_sample_cards(card_count=25):
+    """Return the cards every parser should extract from the generated sample page"""
+    return [{
+        'link': f"https://www.linkedin.com/jobs/view/software-engineer-at-acme-{4170000000 + i}",
+        'title': f"Software Engineer & QA {i}",
+        'company': f"Acme {i}",
+        'location': "Remote, United States",
+        'posted_time': "2025-04-01"
+    } for i in range(card_count)]
+
+def load_pages(paths):
+    """Load saved result pages, or a generated sample page if none were given"""
+    if not paths:
+        print("No saved pages given, using a generated sample page")
+        return {"sample": build_sample_page()}
+    
+    pages = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[path] = f.read()
+    return pages
+
+def main(paths, iterations=50):
+    pages = load_pages(paths)
+    parsers = {name: parser_class() for name, parser_class in PARSERS.items()}
+    print(f"Fast tree builder: {FAST_TREE_BUILDER}\n")
+    
+    mismatches = 0
+    for page_name, html in pages.items():
+        results = {name: parser.parse(html) for name, parser in parsers.items()}
+        baseline_name = next(iter(results))
+        baseline = results[baseline_name]
+        
+        print(f"=== {page_name} ({len(html)} bytes, {len(baseline)} job cards) ===")
+        # Identical output is no use if every parser misses a field, so check the sample's known values
+        if page_name == "sample" and baseline != expected_sample_cards():
+            mismatches += 1
+            print(f"✗ {baseline_name} does not extract the sample page's fields")
+        for name, parser in parsers.items():
+            if results[name] != baseline:
+                mismatches += 1
+                print(f"✗ {name} does not match {baseline_name}")
+            
+            seconds = timeit.timeit(lambda: parser.parse(html), number=iterations) / iterations
+            print(f"{name:>10}: {seconds * 1000:.2f} ms per page")
+        print()
+    
+    if mismatches:
+        print(f"Parity check FAILED with {mismatches} mismatches")
+        return 1
+    
+    print("Parity check passed: all parsers produced identical job cards")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Routing benchmark for per-chat subscriptions.
+Compares checking every subscription's patterns against each job one by one
+(a word-boundary regex per pattern) with the SubscriptionRouter, which
+compiles every pattern into one Aho-Corasick automaton. Both have to pick
+the same chats for every job.
+
+Usage:
+    python benchmark_routing.py                 (10 to 5000 subscribers)
+    python benchmark_routing.py 100 1000 20000
+"""
+
+import re
+import sys
+import time
+import random
+from subscriptions import SubscriptionRouter
+
+TITLE_WORDS = ['senior', 'junior', 'lead', 'staff', 'principal', 'qa', 'sdet', 'java', 'python', 'golang',
+               'backend', 'frontend', 'fullstack', 'data', 'platform', 'mobile', 'ios', 'android', 'devops',
+               'engineer', 'developer', 'analyst', 'tester', 'automation', 'manual', 'intern', 'contract']
+LOCATIONS = ['Remote', 'New York, NY', 'Austin, TX', 'Berlin, Germany', 'London, United Kingdom', 'Toronto, ON',
+             'San Francisco, CA', 'Warsaw, Poland', 'Lisbon, Portugal', 'Bangalore, India']
+# Rare made-up skills stand in for the long tail of niche keywords real subscribers use
+NICHE_WORDS = [f"skill{index}" for index in range(20000)]
+
+def generate_jobs(job_count, rng):
+    jobs = []
+    for index in range(job_count):
+        title = ' '.join(rng.sample(TITLE_WORDS, 3) + [rng.choice(NICHE_WORDS)])
+        jobs.append({'signature': str(index), 'title': title.title(), 'company': f"Company {rng.randint(1, 500)}",
+                     'location': rng.choice(LOCATIONS), 'keyword': 'qa', 'keywords': ['qa']})
+    return jobs
+
+def generate_subscriptions(subscriber_count, rng):
+    subscriptions = {}
+    for index in range(subscriber_count):
+        # Most subscribers follow niche skills, a few follow broad role keywords
+        if rng.random() < 0.1:
+            subscription = {'keywords': rng.sample(TITLE_WORDS[5:], 1)}
+        else:
+            subscription = {'keywords': rng.sample(NICHE_WORDS, 3)}
+        if rng.random() < 0.5:
+            subscription['exclude'] = rng.sample(TITLE_WORDS[:5], 2)
+        if rng.random() < 0.5:
+            subscription['locations'] = [location.split(',')[0] for location in rng.sample(LOCATIONS, 2)]
+        subscriptions[str(index)] = subscription
+    return subscriptions
+
+def compile_naive(subscriptions):
+    """Compile one (pattern, regex) pair per pattern, grouped by subscription"""
+    def regexes(patterns):
+        return [(pattern.casefold(), re.compile(r'(?<![^\W_])' + re.escape(pattern.casefold()) + r'(?![^\W_])'))
+                for pattern in patterns]
+    return [(chat_id, regexes(subscription.get('keywords', [])), regexes(subscription.get('exclude', [])),
+             regexes(subscription.get('locations', []))) for chat_id, subscription in subscriptions.items()]
+
+def route_naive(compiled, job):
+    text = f"{job['title']} | {job['company']}".casefold()
+    location = job['location'].casefold()
+    keywords = {keyword.casefold() for keyword in job['keywords']}
+    recipients = []
+    for chat_id, include, exclude, locations in compiled:
+        if include and not any(pattern in keywords or regex.search(text) for pattern, regex in include):
+            continue
+        if any(regex.search(text) for _, regex in exclude):
+            continue
+        if locations and not any(regex.search(location) for _, regex in locations):
+            continue
+        recipients.append(chat_id)
+    return recipients
+
+def timed(route, jobs):
+    started = time.perf_counter()
+    routes = [route(job) for job in jobs]
+    return routes, (time.perf_counter() - started) / len(jobs)
+
+def main(*subscriber_counts):
+    subscriber_counts = subscriber_counts or (10, 100, 1000, 5000)
+    rng = random.Random(42)
+    jobs = generate_jobs(500, rng)
+    
+    print(f"{'subscribers':>11} {'patterns':>9} {'recipients':>10} {'naive/job':>11} {'router/job':>11} "
+          f"{'per recipient':>13} {'speedup':>8}")
+    for subscriber_count in subscriber_counts:
+        subscriptions = generate_subscriptions(subscriber_count, rng)
+        router = SubscriptionRouter(subscriptions)
+        compiled = compile_naive(subscriptions)
+        
+        naive_routes, naive_time = timed(lambda job: route_naive(compiled, job), jobs)
+        router_routes, router_time = timed(router.route, jobs)
+        for job, expected, actual in zip(jobs, naive_routes, router_routes):
+            if sorted(expected, key=int) != sorted(actual, key=int):
+                print(f"✗ Routes differ for '{job['title']}' in {job['location']}")
+                return 1
+        
+        # The router's cost follows the number of chats a job goes to, not the number of subscriptions
+        recipients = sum(len(route) for route in router_routes) / len(jobs)
+        print(f"{subscriber_count:>11} {len(router.matcher.patterns):>9} {recipients:>10.1f} {naive_time * 1e6:>9.0f}us "
+              f"{router_time * 1e6:>9.0f}us {router_time * 1e6 / max(recipients, 1):>11.2f}us "
+              f"{naive_time / router_time:>7.0f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
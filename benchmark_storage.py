@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Memory and load-time benchmark for the seen jobs storage.
+Compares the previous representation (a dict of job ID strings to keyword
+sets plus an ordered first-seen dict, saved as JSON) with the SeenSet used
+by JobStorage (int64 keys with a keyword set ID, saved as a binary snapshot).
+
+Usage:
+    python benchmark_storage.py            (1,000,000 jobs)
+    python benchmark_storage.py 250000
+"""
+
+import sys
+import json
+import time
+import random
+import tracemalloc
+from collections import OrderedDict
+from seen_set import SeenSet, job_key
+
+KEYWORDS = ['qa', 'java', 'python', 'automation', 'sdet', 'test engineer']
+
+def generate_jobs(job_count):
+    """Generate (job ID, keywords, first seen time) tuples shaped like real LinkedIn jobs"""
+    rng = random.Random(42)
+    job_id = 4170000000
+    seen_at = time.time() - 30 * 24 * 3600
+    jobs = []
+    for _ in range(job_count):
+        job_id += rng.randint(1, 40)
+        seen_at += rng.random() * 2
+        jobs.append((str(job_id), rng.sample(KEYWORDS, rng.choice((1, 1, 1, 2))), seen_at))
+    return jobs
+
+def measure(build):
+    """Return (result, bytes allocated, seconds) for a build function"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated, elapsed
+
+def build_dict(jobs):
+    seen_jobs = {}
+    first_seen = OrderedDict()
+    for job_id, keywords, seen_at in jobs:
+        seen_jobs[job_id] = set(keywords)
+        first_seen[job_id] = seen_at
+    return seen_jobs, first_seen
+
+def dump_dict(structure):
+    seen_jobs, first_seen = structure
+    return json.dumps({job_id: {'seen_at': seen_at, 'keywords': sorted(seen_jobs[job_id])}
+                       for job_id, seen_at in first_seen.items()}).encode('utf-8')
+
+def load_dict(data):
+    seen_jobs = {}
+    first_seen = OrderedDict()
+    for job_id, record in json.loads(data).items():
+        seen_jobs[job_id] = set(record['keywords'])
+        first_seen[job_id] = record['seen_at']
+    return seen_jobs, first_seen
+
+def build_seen_set(jobs):
+    seen_set = SeenSet()
+    for job_id, keywords, seen_at in jobs:
+        seen_set.add(job_key(job_id), seen_set.keyword_set(keywords), seen_at)
+    return seen_set
+
+def report(name, memory, build_time, snapshot, load_time):
+    print(f"{name:>8}: {memory / 1024 / 1024:8.1f} MB in memory, {len(snapshot) / 1024 / 1024:8.1f} MB on disk, "
+          f"built in {build_time:6.2f}s, loaded in {load_time:6.3f}s")
+
+def main(job_count=1000000):
+    print(f"Generating {job_count} jobs...")
+    jobs = generate_jobs(job_count)
+    
+    structure, dict_memory, dict_build = measure(lambda: build_dict(jobs))
+    dict_snapshot = dump_dict(structure)
+    del structure
+    loaded, _, dict_load = measure(lambda: load_dict(dict_snapshot))
+    del loaded
+    
+    seen_set, set_memory, set_build = measure(lambda: build_seen_set(jobs))
+    set_snapshot = seen_set.to_bytes()
+    loaded, _, set_load = measure(lambda: SeenSet.from_bytes(set_snapshot))
+    
+    # Both representations have to agree before the numbers mean anything
+    sample = random.Random(7).sample(jobs, min(1000, job_count))
+    for job_id, keywords, _ in sample:
+        set_id = loaded.get(job_key(job_id))
+        if set_id is None or loaded.set_keywords(set_id) != set(keywords):
+            print(f"✗ Job {job_id} did not survive the binary snapshot")
+            return 1
+    
+    print()
+    report('dict', dict_memory, dict_build, dict_snapshot, dict_load)
+    report('seenset', set_memory, set_build, set_snapshot, set_load)
+    print(f"\nMemory {dict_memory / set_memory:.1f}x smaller, "
+          f"load {dict_load / max(set_load, 1e-9):.0f}x faster, "
+          f"snapshot {len(dict_snapshot) / len(set_snapshot):.1f}x smaller")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:2])))
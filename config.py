@@ -10,17 +10,102 @@ KEYWORDS = os.getenv('KEYWORDS', 'qa,java').split(',')
 LOCATION = os.getenv('LOCATION', 'United States')
 REMOTE_ONLY = os.getenv('REMOTE_ONLY', 'true').lower() == 'true'
 DAYS_RECENT = int(os.getenv('DAYS_RECENT', '1'))  # Jobs posted in last X days
+KEYWORDS_PER_QUERY = int(os.getenv('KEYWORDS_PER_QUERY', '1'))  # Keywords folded into one "a OR b" search
 
 # Time intervals
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '300'))  # 5 minutes between checks
 
+# Polling mode: 'fixed' checks every query together each CHECK_INTERVAL, 'adaptive' polls busy queries
+# more often and quiet ones less, 'staggered' spreads the queries evenly across each CHECK_INTERVAL.
+# ADAPTIVE_POLLING=true from before POLL_MODE existed still selects 'adaptive' when POLL_MODE isn't set.
+POLL_MODE = os.getenv('POLL_MODE', 'adaptive' if os.getenv('ADAPTIVE_POLLING', 'false').lower() == 'true' else 'fixed').lower()
+POLL_JITTER = float(os.getenv('POLL_JITTER', '0.2'))  # Staggered mode jitter as a fraction of the gap between queries
+MIN_POLL_INTERVAL = int(os.getenv('MIN_POLL_INTERVAL', '60'))  # Fastest a single query is polled, in seconds
+MAX_POLL_INTERVAL = int(os.getenv('MAX_POLL_INTERVAL', '3600'))  # Slowest a single query is polled, in seconds
+POLL_TARGET_NEW_JOBS = float(os.getenv('POLL_TARGET_NEW_JOBS', '1'))  # New jobs we aim to find per poll
+POLL_EWMA_ALPHA = float(os.getenv('POLL_EWMA_ALPHA', '0.3'))  # Weight of the latest poll in the arrival rate average
+POLL_REQUEST_BUDGET = int(os.getenv('POLL_REQUEST_BUDGET', '0'))  # Max query polls per hour across all queries (0 = no limit)
+
+# Concurrency settings
+MAX_CONCURRENT_SEARCHES = int(os.getenv('MAX_CONCURRENT_SEARCHES', '4'))  # Parallel keyword searches per check (per process)
+SEARCH_WORKER_PROCESSES = int(os.getenv('SEARCH_WORKER_PROCESSES', '0'))  # Shard searches across processes (0 = in-process)
+
+# Optional JSON file describing keywords x locations x filters to search (see search_matrix.py)
+SEARCH_MATRIX_FILE = os.getenv('SEARCH_MATRIX_FILE', 'search_matrix.json')
+
 # LinkedIn search parameters
 LINKEDIN_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# HTML parser backend for search results: 'strainer' (fast, only parses job cards) or 'soup' (full tree)
+HTML_PARSER = os.getenv('HTML_PARSER', 'strainer')
+
+# Streaming mode parses results while they download and stops at a run of already-seen jobs
+STREAM_SEARCH_RESULTS = os.getenv('STREAM_SEARCH_RESULTS', 'false').lower() == 'true'
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '8192'))  # Bytes read per chunk
+STREAM_STOP_AFTER_SEEN = int(os.getenv('STREAM_STOP_AFTER_SEEN', '5'))  # Consecutive seen cards that end the read
+
+# Pagination settings (walks LinkedIn's guest job-listing endpoint instead of the first results page)
+PAGINATED_SEARCH = os.getenv('PAGINATED_SEARCH', 'false').lower() == 'true'
+MAX_PAGES_PER_KEYWORD = int(os.getenv('MAX_PAGES_PER_KEYWORD', '10'))  # Upper bound on pages fetched per keyword
+
+# HTTP client settings shared by all outbound requests
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))  # Seconds to establish a connection
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '20'))  # Seconds to wait for response data
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))  # Number of per-host pools to keep
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))  # Keep-alive connections kept per host
+HTTP_MODE = os.getenv('HTTP_MODE', 'live').lower()  # 'live', 'record' (save traffic) or 'replay' (serve saved traffic offline)
+HTTP_FIXTURE_ARCHIVE = os.getenv('HTTP_FIXTURE_ARCHIVE', 'fixtures/traffic.json.gz')
+
+# Adaptive rate limiting for LinkedIn requests (shared by all scraper workers)
+RATE_LIMIT_INITIAL_RATE = float(os.getenv('RATE_LIMIT_INITIAL_RATE', '0.5'))  # Requests per second per host
+RATE_LIMIT_MIN_RATE = float(os.getenv('RATE_LIMIT_MIN_RATE', '0.05'))  # Floor after repeated throttling
+RATE_LIMIT_MAX_RATE = float(os.getenv('RATE_LIMIT_MAX_RATE', '2'))  # Ceiling when ramping back up
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '3'))  # Requests allowed back to back
+RATE_LIMIT_RAMP_STEP = float(os.getenv('RATE_LIMIT_RAMP_STEP', '0.02'))  # Rate increase per successful request
+RATE_LIMIT_MAX_BACKOFF = float(os.getenv('RATE_LIMIT_MAX_BACKOFF', '300'))  # Longest pause after throttling, in seconds
+LINKEDIN_MAX_RETRIES = int(os.getenv('LINKEDIN_MAX_RETRIES', '2'))  # Retries for a throttled LinkedIn request
+
+# Telegram notification dispatch (Telegram allows about 30 messages/s per bot, 1/s per chat and 20/min per group)
+TELEGRAM_SEND_WORKERS = int(os.getenv('TELEGRAM_SEND_WORKERS', '16'))  # Chats sent to concurrently
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))  # Messages per second across all chats
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))  # Messages per second to one private chat
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', str(20 / 60)))  # Messages per second to one group chat
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))  # Retries for a throttled or failed send
+TELEGRAM_DIGEST_THRESHOLD = int(os.getenv('TELEGRAM_DIGEST_THRESHOLD', '5'))  # New jobs in one cycle that switch to a digest (0 always sends one message per job)
+TELEGRAM_DIGEST_BY_KEYWORD = os.getenv('TELEGRAM_DIGEST_BY_KEYWORD', 'false').lower() == 'true'  # Separate digest messages for each keyword
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')  # Per-chat keyword, excluded word and location filters
+TELEGRAM_POLL_TIMEOUT = int(os.getenv('TELEGRAM_POLL_TIMEOUT', '50'))  # Seconds a getUpdates long poll waits for new updates
+TELEGRAM_UPDATES_FILE = os.getenv('TELEGRAM_UPDATES_FILE', 'telegram_updates.json')  # Last handled update offset and known chats
+TELEGRAM_UPDATES_SAVE_INTERVAL = float(os.getenv('TELEGRAM_UPDATES_SAVE_INTERVAL', '1'))  # Seconds between saves of the update offset while updates keep coming (0 saves after every update)
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')  # Public base URL of this app; when set, Telegram pushes updates instead of being polled
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')  # Secret token Telegram sends with every webhook request
+TELEGRAM_WEBHOOK_QUEUE_SIZE = int(os.getenv('TELEGRAM_WEBHOOK_QUEUE_SIZE', '1000'))  # Updates waiting for a worker before requests are turned away
+TELEGRAM_WEBHOOK_WORKERS = int(os.getenv('TELEGRAM_WEBHOOK_WORKERS', '4'))  # Threads handling webhook updates
+
+# Notification outbox (jobs wait here durably until the delivery worker has sent them)
+NOTIFY_OUTBOX_FILE = os.getenv('NOTIFY_OUTBOX_FILE', 'notification_outbox.db')
+NOTIFY_LEASE_SECONDS = int(os.getenv('NOTIFY_LEASE_SECONDS', '300'))  # Time a delivery may take before the jobs are handed out again
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '8'))  # Delivery attempts before a job is given up on
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '100'))  # Jobs sent together (and digested together) per batch
+NOTIFY_DEAD_CHAT_FAILURES = int(os.getenv('NOTIFY_DEAD_CHAT_FAILURES', '20'))  # Failures in a row before a chat is reported as dead
+
+# Job detail enrichment (fetches descriptions in the background after notifications are sent)
+ENRICH_JOBS = os.getenv('ENRICH_JOBS', 'true').lower() == 'true'
+ENRICH_WORKERS = int(os.getenv('ENRICH_WORKERS', '2'))  # Parallel job detail requests
+ENRICH_CACHE_DIR = os.getenv('ENRICH_CACHE_DIR', 'job_cache')
+ENRICH_CACHE_TTL = int(os.getenv('ENRICH_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds before a cached detail page expires
+ENRICH_CACHE_MAX_BYTES = int(os.getenv('ENRICH_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))  # Cache size before evicting oldest entries
+
 # Seen jobs storage
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'file')  # 'file' (JSON snapshot and journal) or 'sqlite'
+STORAGE_DB_FILE = os.getenv('STORAGE_DB_FILE', 'seen_jobs.db')  # Used by the sqlite backend
 STORAGE_FILE = os.getenv('STORAGE_FILE', 'seen_jobs.txt')
+STORAGE_TTL_DAYS = float(os.getenv('STORAGE_TTL_DAYS', str(2 * DAYS_RECENT if DAYS_RECENT > 0 else 0)))  # Forget jobs first seen longer ago than this (0 keeps them forever, the default without a DAYS_RECENT window); SQLite keeps notified job records
+STORAGE_COMPACT_BYTES = int(os.getenv('STORAGE_COMPACT_BYTES', str(256 * 1024)))  # Journal size that triggers compaction
+STORAGE_HOT_MAX_JOBS = int(os.getenv('STORAGE_HOT_MAX_JOBS', '0'))  # Jobs kept in memory before merging into the archive (0 keeps all in memory)
+STORAGE_BLOOM_BITS_PER_JOB = int(os.getenv('STORAGE_BLOOM_BITS_PER_JOB', '10'))  # About 1% false positives at 10 bits
 
 # Application settings
 DEBUG_MODE = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
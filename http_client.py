@@ -0,0 +1,105 @@
+import atexit
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_MODE,
+                    HTTP_FIXTURE_ARCHIVE)
+from traffic_archive import TrafficArchive
+from logger import logger
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes br responses when brotli is installed
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+class HttpClient:
+    """Shared HTTP client that pools keep-alive connections per host for all outbound requests
+    
+    In 'record' mode every exchange is also saved to a compressed fixture
+    archive, and in 'replay' mode responses are served from that archive
+    without touching the network.
+    """
+    
+    def __init__(self, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 mode=HTTP_MODE, archive_path=HTTP_FIXTURE_ARCHIVE):
+        self.timeout = timeout
+        self.mode = mode
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        
+        self._lock = threading.Lock()
+        self.failed_requests = 0
+        
+        self.archive = None
+        if mode in ('record', 'replay'):
+            self.archive = TrafficArchive(archive_path)
+            self.archive.load()
+            if mode == 'record':
+                atexit.register(self.archive.save)
+            logger.info(f"HTTP client running in {mode} mode with archive {archive_path}")
+    
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session, applying the default timeout"""
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            if self.mode == 'replay':
+                return self.archive.replay(method, url)
+            
+            response = self.session.request(method, url, **kwargs)
+            if self.mode == 'record':
+                self.archive.record(method, url, response)
+            return response
+        except requests.RequestException:
+            with self._lock:
+                self.failed_requests += 1
+            raise
+    
+    def get(self, url, **kwargs):
+        """Send a GET request"""
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url, **kwargs):
+        """Send a POST request"""
+        return self.request('POST', url, **kwargs)
+    
+    def get_stats(self):
+        """Return connection reuse counters for every pooled host
+        
+        urllib3 counts each new connection it opens (a fresh TCP+TLS handshake)
+        and each request it sends, so the difference is the number of requests
+        that reused a keep-alive connection.
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_scheme}://{key.key_host}"
+            stats = hosts.setdefault(host, {'requests': 0, 'new_connections': 0, 'reused_connections': 0})
+            stats['requests'] += pool.num_requests
+            stats['new_connections'] += pool.num_connections
+            stats['reused_connections'] += max(0, pool.num_requests - pool.num_connections)
+        
+        return {
+            'requests': sum(stats['requests'] for stats in hosts.values()),
+            'new_connections': sum(stats['new_connections'] for stats in hosts.values()),
+            'reused_connections': sum(stats['reused_connections'] for stats in hosts.values()),
+            'failed_requests': self.failed_requests,
+            'mode': self.mode,
+            'hosts': hosts
+        }
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+        logger.debug("Closed HTTP client connections")
+
+# Shared instance used by the scraper, notifier and helper scripts
+http_client = HttpClient()
@@ -1,78 +1,243 @@
 import threading
 import time
 import datetime
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from logger import logger
-from config import CHECK_INTERVAL, KEYWORDS
+from config import (CHECK_INTERVAL, MAX_CONCURRENT_SEARCHES, SEARCH_WORKER_PROCESSES, ENRICH_JOBS, POLL_MODE,
+                    STORAGE_TTL_DAYS)
 from linkedin_scraper import LinkedInScraper
 from telegram_notifier import TelegramNotifier
-from job_storage import JobStorage
-from app_state import update_state
+from notification_outbox import NotificationOutbox, DeliveryWorker
+from job_storage import create_job_storage
+from job_enricher import JobEnricher
+from search_matrix import load_search_matrix, expand_search_matrix, shard_units, run_shard
+from poll_scheduler import create_scheduler
+from app_state import update_state, restore_recent_jobs, MAX_RECENT_JOBS
 
 class JobChecker:
     """Class to periodically check for new jobs and send notifications"""
     
     def __init__(self):
-        self.job_storage = JobStorage()
+        self.job_storage = create_job_storage()
+        restore_recent_jobs(self.job_storage.get_recent_jobs(MAX_RECENT_JOBS))
         self.linkedin_scraper = LinkedInScraper(self.job_storage)
         self.telegram_notifier = TelegramNotifier()
+        self.notification_outbox = NotificationOutbox()
+        self.delivery_worker = DeliveryWorker(self.notification_outbox, self.telegram_notifier)
+        self.job_enricher = JobEnricher() if ENRICH_JOBS else None
+        self.search_matrix = load_search_matrix()
+        self.keywords = self.search_matrix['keywords']
+        self.query_units = expand_search_matrix(self.search_matrix)
+        self.poll_scheduler = create_scheduler(POLL_MODE, self.query_units)
+        self._check_storage_ttl()
+        self.process_pool = None  # Created on first use when searches are sharded across processes
         self.running = False
         self.thread = None
+        self.last_fetch_stats = None
     
-    def check_jobs(self):
-        """Check for new jobs for all keywords"""
+    def _check_storage_ttl(self):
+        """Warn if seen jobs expire while a search can still list them, which would notify them again"""
+        if STORAGE_TTL_DAYS <= 0:
+            return
+        windows = [query.days_recent for query in self.query_units]
+        if any(window <= 0 for window in windows):
+            logger.warning(f"Some searches have no days_recent window but STORAGE_TTL_DAYS is {STORAGE_TTL_DAYS:g}; "
+                           f"their jobs will be notified again once they expire (set STORAGE_TTL_DAYS=0)")
+        elif STORAGE_TTL_DAYS <= max(windows):
+            logger.warning(f"STORAGE_TTL_DAYS ({STORAGE_TTL_DAYS:g}) is not longer than the {max(windows):g}-day "
+                           f"search window; jobs still listed will be notified again once they expire")
+    
+    def _fetch_query(self, query):
+        """Fetch jobs for a single query unit, returning the jobs and the time it took"""
+        started = time.monotonic()
+        try:
+            jobs = self.linkedin_scraper.get_jobs(query)
+        except Exception as e:
+            logger.error(f"Error checking {query} jobs: {e}", exc_info=True)
+            # Continue with the other queries instead of stopping completely
+            jobs = []
+        return jobs, time.monotonic() - started
+    
+    def _fetch_all_queries(self, queries):
+        """Fetch jobs for all query units in parallel, keeping results in query order"""
+        max_workers = max(1, min(MAX_CONCURRENT_SEARCHES, len(queries)))
+        started = time.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='keyword-fetch') as executor:
+            # map() yields results in input order, so merging stays deterministic
+            results = list(executor.map(self._fetch_query, queries))
+        
+        self._record_fetch_stats(len(queries), f"{max_workers} workers", time.monotonic() - started,
+                                 sum(elapsed for _, elapsed in results))
+        return [(query, jobs) for query, (jobs, _) in zip(queries, results)]
+    
+    def _fetch_sharded_queries(self, queries):
+        """Fetch query units sharded across worker processes, then dedupe them in one merge stage
+        
+        Each process has its own HTTP pool and rate-limit budget, so throughput
+        scales with SEARCH_WORKER_PROCESSES. Workers only search; marking jobs as
+        seen happens here, in query order, so the merge stays deterministic.
+        """
+        started = time.monotonic()
+        if self.process_pool is None:
+            # Spawn rather than fork, since this process also runs web and notifier threads
+            self.process_pool = ProcessPoolExecutor(max_workers=SEARCH_WORKER_PROCESSES,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        
+        shards = shard_units(queries, SEARCH_WORKER_PROCESSES)
+        futures = [self.process_pool.submit(run_shard, shard) for shard in shards]
+        
+        results = [[] for _ in queries]
+        sequential_time = 0.0
+        for future in futures:
+            try:
+                for index, jobs, elapsed in future.result():
+                    results[index] = jobs
+                    sequential_time += elapsed
+            except Exception as e:
+                logger.error(f"Error in search worker process: {e}", exc_info=True)
+        
+        first_run = self.linkedin_scraper.first_run
+        merged = []
+        for query, jobs in zip(queries, results):
+            new_jobs = [job for job in jobs if self.job_storage.mark_job_seen(job['signature'], job['keywords'])]
+            if first_run:
+                logger.info(f"First run: Marked {len(new_jobs)} existing {query} jobs as seen (no notifications sent)")
+                new_jobs = []
+            merged.append((query, new_jobs))
+        
+        self._record_fetch_stats(len(queries), f"{len(shards)} processes", time.monotonic() - started, sequential_time)
+        return merged
+    
+    def _record_fetch_stats(self, query_count, workers, wall_time, sequential_time):
+        """Store and log how long fetching took compared to running every query in turn"""
+        self.last_fetch_stats = {
+            'queries': query_count,
+            'workers': workers,
+            'wall_time': round(wall_time, 2),
+            'sequential_time': round(sequential_time, 2),
+            'saved_time': round(max(0.0, sequential_time - wall_time), 2)
+        }
+        logger.info(f"Fetched {query_count} queries with {workers} in {wall_time:.1f}s "
+                    f"(sequential estimate {sequential_time:.1f}s, saved {self.last_fetch_stats['saved_time']:.1f}s)")
+    
+    def _merge_job_keywords(self, jobs):
+        """Attach every keyword each job has matched so far, in configured keyword order
+        
+        A job is only returned by the first search that marks it, so keywords that
+        other searches matched in the same cycle are collected from storage.
+        """
+        keyword_order = {keyword: index for index, keyword in enumerate(self.keywords)}
+        for job in jobs:
+            keywords = self.job_storage.get_job_keywords(job['signature']) or set(job['keywords'])
+            job['keywords'] = sorted(keywords, key=lambda keyword: (keyword_order.get(keyword, len(keyword_order)), keyword))
+            job['keyword'] = job['keywords'][0]
+        return jobs
+    
+    def check_jobs(self, query_units=None):
+        """Check for new jobs for the given query units (all of them by default)"""
         logger.info("Checking for new jobs...")
         all_new_jobs = []
         first_run = self.linkedin_scraper.first_run
         
+        # The first run has to mark existing jobs for every query, whatever is due
+        if query_units is None or first_run:
+            query_units = self.query_units
+        
         try:
-            for keyword in KEYWORDS:
-                try:
-                    jobs = self.linkedin_scraper.get_jobs(keyword)
-                    all_new_jobs.extend(jobs)
-                    
-                    if not first_run:
-                        logger.info(f"Found {len(jobs)} new {keyword} jobs")
-                except Exception as e:
-                    logger.error(f"Error checking {keyword} jobs: {e}", exc_info=True)
-                    # Continue with next keyword instead of stopping completely
-                    continue
+            if SEARCH_WORKER_PROCESSES > 0:
+                results = self._fetch_sharded_queries(query_units)
+            else:
+                results = self._fetch_all_queries(query_units)
+            
+            for query, jobs in results:
+                all_new_jobs.extend(jobs)
+                self.poll_scheduler.record_poll(query, len(jobs), sample=not first_run)
+                
+                if not first_run:
+                    logger.info(f"Found {len(jobs)} new {query} jobs")
+            
+            self._merge_job_keywords(all_new_jobs)
             
             # If this was the first run, reset the flag for future runs
             if first_run:
                 self.linkedin_scraper.first_run = False
                 logger.info("First run completed - future jobs will trigger notifications")
             
+            # Queue the jobs in the outbox before they are saved as seen, so a crash in between
+            # can only cause a repeat notification, never a lost one
+            try:
+                self.notification_outbox.add(all_new_jobs)
+            except Exception as e:
+                logger.error(f"Error queueing notifications, retrying these jobs next check: {e}", exc_info=True)
+                # Jobs missing from the outbox must not be saved as seen, or they would never be notified
+                self.job_storage.unmark_jobs([job['signature'] for job in all_new_jobs])
+                update_state(next_check_seconds=self._next_check_seconds())
+                return 0
+            
             # Save all seen jobs to storage after processing all keywords
             # This prevents duplicate notifications from race conditions
             try:
-                self.job_storage._save_seen_jobs()
+                self.job_storage.record_jobs(all_new_jobs)
+                # Jobs older than the search window can't come back, so stop remembering them
+                self.job_storage.evict_expired()
+                # Another bot process sharing the storage may have claimed some of these jobs first
+                claimed_elsewhere = self.job_storage._save_seen_jobs()
+                if claimed_elsewhere:
+                    all_new_jobs = [job for job in all_new_jobs if job['signature'] not in claimed_elsewhere]
+                    self.notification_outbox.discard(claimed_elsewhere)
             except Exception as e:
                 logger.error(f"Error saving seen jobs: {e}", exc_info=True)
-                
+            
             # Update the application state with job count and job data
-            update_state(len(all_new_jobs), all_new_jobs)
+            update_state(len(all_new_jobs), all_new_jobs, self._next_check_seconds())
             
-            # Send notifications for new jobs
-            notification_count = 0
+            # The delivery worker sends the queued notifications while the next cycle runs
             for job in all_new_jobs:
-                try:
-                    if self.telegram_notifier.send_message(job):
-                        notification_count += 1
-                        logger.info(f"Sent notification for {job['keyword']} job: {job['title']}")
-                except Exception as e:
-                    logger.error(f"Error sending notification for job {job.get('title', 'Unknown')}: {e}")
+                logger.info(f"Queued notification for {job['keyword']} job: {job['title']}")
+            if all_new_jobs:
+                self.delivery_worker.notify()
             
-            logger.info(f"Sent {notification_count} notifications")
+            # Fetch job details in the background once notifications are out of the way
+            if self.job_enricher and all_new_jobs:
+                self.job_enricher.enrich_jobs(all_new_jobs)
             return len(all_new_jobs)
-            
+        
         except Exception as e:
             logger.error(f"Critical error in job checking process: {e}", exc_info=True)
             # Still update the state to reflect the check was attempted
-            update_state()
+            update_state(next_check_seconds=self._next_check_seconds())
             return 0
     
+    def _next_check_seconds(self):
+        """Seconds until the loop will check again"""
+        if POLL_MODE in ('adaptive', 'staggered'):
+            return self.poll_scheduler.seconds_until_next_poll()
+        return CHECK_INTERVAL
+    
+    def scheduled_check_loop(self):
+        """Loop that polls each query when the scheduler says it is due"""
+        logger.info(f"Starting {POLL_MODE} job check loop")
+        
+        while self.running:
+            due_units = self.poll_scheduler.due_units()
+            if due_units or self.linkedin_scraper.first_run:
+                try:
+                    self.check_jobs(due_units)
+                except Exception as e:
+                    logger.error(f"Error in job check loop: {e}")
+            
+            # Sleep until the next query is due, in short chunks to allow for cleaner shutdown
+            wait = self.poll_scheduler.seconds_until_next_poll()
+            logger.debug(f"Next query due in {wait:.0f} seconds")
+            time.sleep(min(5, max(0.05, wait)))
+    
     def job_check_loop(self):
         """Main loop to periodically check for jobs"""
+        if POLL_MODE in ('adaptive', 'staggered'):
+            return self.scheduled_check_loop()
+        
         logger.info(f"Starting job check loop with interval of {CHECK_INTERVAL} seconds")
         
         while self.running:
@@ -102,6 +267,11 @@ class JobChecker:
             return
         
         self.running = True
+        # stop() shuts these down, so reopen them when the checker is started again
+        self.telegram_notifier.dispatcher.start()
+        if self.job_enricher:
+            self.job_enricher.start()
+        self.delivery_worker.start()
         self.thread = threading.Thread(target=self.job_check_loop)
         self.thread.daemon = True  # Allow the program to exit even if this thread is running
         self.thread.start()
@@ -113,6 +283,15 @@ class JobChecker:
         if self.thread:
             self.thread.join(timeout=10)  # Wait up to 10 seconds for the thread to finish
             logger.info("Job checker stopped")
+        if self.job_enricher:
+            self.job_enricher.shutdown()
+        # Unsent notifications stay in the outbox and go out after the next start
+        self.delivery_worker.stop()
+        self.telegram_notifier.dispatcher.shutdown()
+        self.delivery_worker.join()
+        if self.process_pool:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool = None
     
     def send_test_message(self, chat_id=None):
         """Send a test message to verify Telegram integration"""
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import (LINKEDIN_HEADERS, ENRICH_WORKERS, ENRICH_CACHE_DIR, ENRICH_CACHE_TTL,
+                    ENRICH_CACHE_MAX_BYTES)
+from http_client import http_client
+from rate_limiter import rate_limiter
+from job_parser import parse_job_details
+from logger import logger
+
+# LinkedIn's guest endpoint for a single job posting
+JOB_DETAIL_URL = 'https://www.linkedin.com/jobs-guest/jobs/api/jobPosting/{job_id}'
+# Bumped when the shape of cached details changes, so older entries are refetched
+DETAILS_FORMAT = 2
+
+class DetailCache:
+    """On-disk cache of parsed job details keyed by job ID, with TTL and size-based eviction
+    
+    Entries are stored as JSON files named after the SHA-256 of the job ID.
+    Once the cache grows past max_bytes the least recently written entries
+    are removed first.
+    """
+    
+    def __init__(self, cache_dir=ENRICH_CACHE_DIR, ttl=ENRICH_CACHE_TTL, max_bytes=ENRICH_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = {}  # path -> (mtime, size)
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+    
+    def _load_index(self):
+        """Index the existing cache files so eviction doesn't need to rescan the directory"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        try:
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    self.entries[entry.path] = (stat.st_mtime, stat.st_size)
+                    self.total_bytes += stat.st_size
+            logger.debug(f"Loaded {len(self.entries)} cached job details ({self.total_bytes} bytes)")
+        except Exception as e:
+            logger.error(f"Error loading job detail cache: {e}")
+    
+    def _path(self, job_id):
+        digest = hashlib.sha256(str(job_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+    
+    def _remove(self, path):
+        """Delete a cache file and drop it from the index (caller holds the lock)"""
+        mtime, size = self.entries.pop(path, (0, 0))
+        self.total_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def get(self, job_id):
+        """Return cached details for a job, or None if missing or expired"""
+        path = self._path(job_id)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cached details for job {job_id}: {e}")
+            return None
+        
+        # Entries cached before descriptions were stored as plain text hold raw HTML
+        if entry.get('format') != DETAILS_FORMAT or time.time() - entry.get('fetched_at', 0) > self.ttl:
+            with self._lock:
+                self._remove(path)
+            return None
+        return entry['details']
+    
+    def put(self, job_id, details):
+        """Store details for a job and evict the oldest entries if the cache is too large"""
+        path = self._path(job_id)
+        data = json.dumps({'job_id': job_id, 'format': DETAILS_FORMAT, 'fetched_at': time.time(), 'details': details})
+        
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(data)
+            except Exception as e:
+                logger.error(f"Error caching details for job {job_id}: {e}")
+                return
+            
+            _, old_size = self.entries.get(path, (0, 0))
+            self.entries[path] = (time.time(), len(data))
+            self.total_bytes += len(data) - old_size
+            
+            if self.total_bytes > self.max_bytes:
+                for old_path, _ in sorted(self.entries.items(), key=lambda item: item[1][0]):
+                    if self.total_bytes <= self.max_bytes or old_path == path:
+                        break
+                    self._remove(old_path)
+
+class JobEnricher:
+    """Fetches job detail pages in the background through a bounded worker pool"""
+    
+    def __init__(self, cache=None, max_workers=ENRICH_WORKERS):
+        self.cache = cache or DetailCache()
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-enrich')
+        self.closed = False
+        self.in_flight = set()
+        self._lock = threading.Lock()
+        self.stats = {'cache_hits': 0, 'fetched': 0, 'failed': 0}
+    
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def enrich_jobs(self, jobs):
+        """Queue jobs for enrichment and return immediately
+        
+        Jobs are updated in place with description and date_posted, so the
+        dicts already stored in app_state pick up the details when they arrive.
+        """
+        for job in jobs:
+            job_id = job.get('signature')
+            with self._lock:
+                if self.closed or not job_id or job_id in self.in_flight:
+                    continue
+                self.in_flight.add(job_id)
+                self.executor.submit(self._enrich_job, job)
+    
+    def _enrich_job(self, job):
+        job_id = job['signature']
+        try:
+            details = self.cache.get(job_id)
+            if details is not None:
+                self._count('cache_hits')
+            else:
+                details = self._fetch_details(job_id)
+                if details is None:
+                    self._count('failed')
+                    return
+                self.cache.put(job_id, details)
+                self._count('fetched')
+            
+            job.update({key: value for key, value in details.items() if value})
+            logger.debug(f"Enriched job {job_id}: {job.get('title', 'Unknown')}")
+        except Exception as e:
+            self._count('failed')
+            logger.error(f"Error enriching job {job_id}: {e}")
+        finally:
+            with self._lock:
+                self.in_flight.discard(job_id)
+    
+    def _fetch_details(self, job_id):
+        """Fetch and parse a job detail page, or return None if the request failed"""
+        url = JOB_DETAIL_URL.format(job_id=job_id)
+        rate_limiter.acquire(url)
+        response = http_client.get(url, headers=LINKEDIN_HEADERS)
+        rate_limiter.record_response(url, response)
+        
+        if response.status_code != 200:
+            logger.warning(f"LinkedIn returned status code {response.status_code} for job {job_id} details")
+            return None
+        return parse_job_details(response.text)
+    
+    def start(self):
+        """Accept work again after a shutdown, with a fresh worker pool"""
+        with self._lock:
+            if not self.closed:
+                return
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-enrich')
+            # Jobs whose tasks were cancelled never left in_flight
+            self.in_flight.clear()
+            self.closed = False
+    
+    def shutdown(self, wait=False):
+        """Stop accepting work and drop queued jobs, or with wait=True finish them first"""
+        with self._lock:
+            self.closed = True
+            executor = self.executor
+        # Workers take the lock as they finish, so wait for them outside it
+        executor.shutdown(wait=wait, cancel_futures=not wait)
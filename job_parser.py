@@ -0,0 +1,239 @@
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, SoupStrainer
+from logger import logger
+
+try:
+    import lxml  # noqa: F401
+    FAST_TREE_BUILDER = 'lxml'
+except ImportError:
+    FAST_TREE_BUILDER = 'html.parser'
+
+# The strainer sees the raw class attribute string, so match base-card as a whole class token
+BASE_CARD_CLASS = re.compile(r'(^|\s)base-card(\s|$)')
+
+class JobCardParser:
+    """Base class for parsers that extract job cards from a LinkedIn results page
+    
+    Every backend returns a list of card dicts with the keys link, title,
+    company, location and posted_time, in page order.
+    """
+    
+    name = None
+    
+    def parse(self, html):
+        """Parse a results page and return its job cards"""
+        raise NotImplementedError
+    
+    def _extract_cards(self, job_cards):
+        """Extract the job fields from BeautifulSoup job card elements"""
+        cards = []
+        for job_card in job_cards:
+            try:
+                # Find job title link
+                job_link_elem = job_card.find('a', {'class': 'base-card__full-link'})
+                if not job_link_elem:
+                    continue
+                
+                # Try to get company name (an h4 in current markup, a span in older pages)
+                company_elem = job_card.find(['h4', 'span'], {'class': 'base-search-card__subtitle'})
+                
+                # Try to get location
+                location_elem = job_card.find('span', {'class': 'job-search-card__location'})
+                
+                # Get posting time
+                time_elem = job_card.find('time', {'class': 'job-search-card__listdate'})
+                if time_elem and 'datetime' in time_elem.attrs:
+                    posted_time = time_elem['datetime']
+                else:
+                    posted_time = "Recently"
+                
+                cards.append({
+                    'link': job_link_elem['href'].split('?')[0],  # Remove query parameters
+                    'title': job_link_elem.text.strip(),
+                    'company': company_elem.text.strip() if company_elem else "Unknown Company",
+                    'location': location_elem.text.strip() if location_elem else "Remote",
+                    'posted_time': posted_time
+                })
+            except Exception as e:
+                logger.error(f"Error parsing job card: {e}")
+        return cards
+
+class SoupJobCardParser(JobCardParser):
+    """Builds the full document tree with Python's html.parser"""
+    
+    name = 'soup'
+    
+    def parse(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        return self._extract_cards(soup.find_all('div', {'class': 'base-card'}))
+
+class StrainedJobCardParser(JobCardParser):
+    """Only builds the div.base-card subtrees, using lxml when it is installed"""
+    
+    name = 'strainer'
+    
+    def __init__(self):
+        self.strainer = SoupStrainer('div', class_=BASE_CARD_CLASS)
+    
+    def parse(self, html):
+        soup = BeautifulSoup(html, FAST_TREE_BUILDER, parse_only=self.strainer)
+        return self._extract_cards(soup.find_all('div', {'class': 'base-card'}))
+
+class _FieldCapture:
+    """Text and attributes collected for one job card field while its element is open"""
+    
+    def __init__(self, field, tag, attrs):
+        self.field = field
+        self.tag = tag
+        self.attrs = attrs
+        self.depth = 1
+        self.text = []
+
+class CardStream(HTMLParser):
+    """Incremental job card parser that emits each card as soon as its closing div is read
+    
+    Mirrors the lookups in JobCardParser._extract_cards for LinkedIn's markup:
+    the first matching element inside each div.base-card provides each field.
+    """
+    
+    # (tag, class) -> field name
+    CARD_FIELDS = {
+        ('a', 'base-card__full-link'): 'link',
+        ('h4', 'base-search-card__subtitle'): 'company',
+        ('span', 'base-search-card__subtitle'): 'company',
+        ('span', 'job-search-card__location'): 'location',
+        ('time', 'job-search-card__listdate'): 'posted_time'
+    }
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards = []  # Completed cards not yet collected
+        self._fields = None  # Captured fields of the card being parsed
+        self._card_depth = 0
+        self._captures = []
+    
+    def feed_cards(self, data):
+        """Feed a chunk of HTML and return the cards completed by it"""
+        self.feed(data)
+        return self.pop_cards()
+    
+    def pop_cards(self):
+        """Return and clear the completed cards"""
+        cards, self.cards = self.cards, []
+        return cards
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        
+        if self._fields is None:
+            if tag == 'div' and 'base-card' in classes:
+                self._fields = {}
+                self._card_depth = 1
+            return
+        
+        if tag == 'div':
+            self._card_depth += 1
+        for capture in self._captures:
+            if capture.tag == tag:
+                capture.depth += 1
+        
+        for class_name in classes:
+            field = self.CARD_FIELDS.get((tag, class_name))
+            if field and field not in self._fields:
+                capture = _FieldCapture(field, tag, attrs)
+                self._fields[field] = capture
+                self._captures.append(capture)
+    
+    def handle_endtag(self, tag):
+        if self._fields is None:
+            return
+        
+        for capture in list(self._captures):
+            if capture.tag == tag:
+                capture.depth -= 1
+                if capture.depth == 0:
+                    self._captures.remove(capture)
+        
+        if tag == 'div':
+            self._card_depth -= 1
+            if self._card_depth == 0:
+                self._finish_card()
+    
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture.text.append(data)
+    
+    def _finish_card(self):
+        fields, self._fields = self._fields, None
+        self._captures = []
+        
+        link = fields.get('link')
+        if not link:
+            return
+        
+        try:
+            if 'href' not in link.attrs:
+                raise KeyError('href')
+            
+            time_capture = fields.get('posted_time')
+            if time_capture and 'datetime' in time_capture.attrs:
+                posted_time = time_capture.attrs['datetime'] or ''
+            else:
+                posted_time = "Recently"
+            
+            company = fields.get('company')
+            location = fields.get('location')
+            self.cards.append({
+                'link': (link.attrs['href'] or '').split('?')[0],  # Remove query parameters
+                'title': ''.join(link.text).strip(),
+                'company': ''.join(company.text).strip() if company else "Unknown Company",
+                'location': ''.join(location.text).strip() if location else "Remote",
+                'posted_time': posted_time
+            })
+        except Exception as e:
+            logger.error(f"Error parsing job card: {e}")
+
+class StreamingJobCardParser(JobCardParser):
+    """Event-based parser that never builds a tree and can consume a response in chunks"""
+    
+    name = 'stream'
+    
+    def start_stream(self):
+        """Return a new incremental parser for one response"""
+        return CardStream()
+    
+    def parse(self, html):
+        stream = self.start_stream()
+        stream.feed(html)
+        stream.close()
+        return stream.pop_cards()
+
+def parse_job_details(html):
+    """Extract the description and posting date from a job detail page"""
+    soup = BeautifulSoup(html, FAST_TREE_BUILDER)
+    
+    description_elem = soup.find('div', {'class': 'show-more-less-html__markup'})
+    date_elem = soup.find('span', {'class': 'posted-time-ago__text'})
+    
+    return {
+        # Plain text only: the page is third-party HTML and must not reach the dashboard as markup
+        'description': description_elem.get_text("\n", strip=True) if description_elem else None,
+        'date_posted': date_elem.text.strip() if date_elem else None
+    }
+
+# Available parser backends by name
+PARSERS = {
+    SoupJobCardParser.name: SoupJobCardParser,
+    StrainedJobCardParser.name: StrainedJobCardParser,
+    StreamingJobCardParser.name: StreamingJobCardParser
+}
+
+def get_parser(name):
+    """Create the parser backend with the given name, falling back to the full tree parser"""
+    parser_class = PARSERS.get(name)
+    if parser_class is None:
+        logger.warning(f"Unknown HTML parser '{name}', falling back to '{SoupJobCardParser.name}'")
+        parser_class = SoupJobCardParser
+    return parser_class()
@@ -1,62 +1,511 @@
 import os
+import re
 import json
-from config import STORAGE_FILE
+import time
+import threading
+from contextlib import contextmanager
+from config import (STORAGE_FILE, STORAGE_COMPACT_BYTES, STORAGE_BACKEND, STORAGE_TTL_DAYS, STORAGE_HOT_MAX_JOBS,
+                    STORAGE_BLOOM_BITS_PER_JOB)
+from seen_set import SeenSet, job_key, MAGIC as SNAPSHOT_MAGIC, BITMASK_MAGIC as BITMASK_SNAPSHOT_MAGIC
+from seen_archive import SeenArchive
 from logger import logger
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Cross-process locking needs POSIX file locks
+
+# LinkedIn job URLs end in a slug whose last dash-separated part is the numeric job ID
+JOB_ID_PATTERN = re.compile(r'(\d+)$')
+
+def extract_job_id(job_slug):
+    """Return the numeric LinkedIn job ID from a job URL or slug, or the slug if it has none"""
+    job_slug = job_slug.rstrip('/').split('/')[-1].strip()
+    match = JOB_ID_PATTERN.search(job_slug)
+    return match.group(1) if match else job_slug
+
 class JobStorage:
-    """Class to manage seen jobs and prevent duplicate notifications"""
+    """Class to manage seen jobs and prevent duplicate notifications
+    
+    Jobs are keyed by their LinkedIn job ID and remember the set of keywords
+    they matched, so a posting found by several keywords is stored once. IDs
+    are held as int64 keys with an interned keyword set ID in a SeenSet, which keeps
+    memory flat at millions of jobs.
+    
+    On disk the storage file holds a binary SeenSet snapshot that loads with
+    a single read, and a journal next to it ({storage_file}.journal) receives
+    one JSON line per job changed since the last save, so each cycle only
+    writes what is new. Once the journal grows past STORAGE_COMPACT_BYTES a
+    background thread writes a fresh snapshot to a temp file and renames it
+    into place.
     
-    def __init__(self, storage_file=STORAGE_FILE):
+    Jobs first seen more than STORAGE_TTL_DAYS ago are evicted in first-seen
+    order without scanning the rest.
+    
+    With STORAGE_HOT_MAX_JOBS set, the SeenSet is only a hot tier: once it
+    holds more jobs than that, compaction merges it into an immutable sorted
+    archive ({storage_file}.archive, see SeenArchive). The archive is
+    memory-mapped rather than loaded, so startup cost no longer grows with
+    the length of the history.
+    
+    Several processes can share the same files. Every read-modify-write of
+    them happens under an exclusive lock on {storage_file}.lock, and each
+    save first applies what other processes journaled (or reloads their
+    snapshot after they compacted). A job counts as new for the process
+    whose first sighting reaches the journal first; _save_seen_jobs returns
+    the jobs this process lost, so they are not notified twice.
+    """
+    
+    def __init__(self, storage_file=STORAGE_FILE, compact_bytes=STORAGE_COMPACT_BYTES, ttl_days=STORAGE_TTL_DAYS,
+                 hot_max_jobs=STORAGE_HOT_MAX_JOBS):
         self.storage_file = storage_file
-        self.seen_jobs = set()
+        self.journal_file = f"{storage_file}.journal"
+        self.compact_bytes = compact_bytes
+        self.ttl = ttl_days * 24 * 3600
+        self.hot_max_jobs = hot_max_jobs
+        self.archive_file = f"{storage_file}.archive"
+        self.lock_file = f"{storage_file}.lock"
+        self.seen = SeenSet()  # Hot tier
+        self.archive = None
+        self._archive_readers = 0  # iter_jobs calls still reading an archive outside the lock
+        self._retired_archives = []  # Replaced archives left open until those readers finish
+        self._lock_fd = None
+        self._generation = None  # Compaction count the loaded snapshot and archive belong to
+        self._journal_offset = 0  # Journal bytes already applied to memory
+        self._lost = set()  # Job IDs marked new here that another process had marked first
+        self._dirty = {}  # job ID -> keywords added since the last save
+        self._dirty_seen_at = {}  # job ID -> first seen time, for jobs new since the last save
+        self._evicted = 0  # Jobs evicted since the last compaction that are still on disk
+        self._needs_compaction = False
+        self._compacting = False
+        # Keyword searches run in parallel, so guard mutations and snapshots
+        self._lock = threading.Lock()
+        # Serializes journal appends with compaction so no entry is lost in between
+        self._io_lock = threading.Lock()
         self._load_seen_jobs()
     
+    @contextmanager
+    def _file_lock(self):
+        """Hold the lock shared by every process using these storage files"""
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            yield
+            return
+        
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+    
+    def _read_generation(self):
+        """Return how many compactions the lock file has recorded (caller holds the file lock)"""
+        data = os.pread(self._lock_fd, 32, 0)
+        return int(data) if data.strip() else 0
+    
+    def _write_generation(self, generation):
+        os.pwrite(self._lock_fd, str(generation).encode('ascii'), 0)
+        os.ftruncate(self._lock_fd, len(str(generation)))
+        self._generation = generation
+    
     def _load_seen_jobs(self):
         """Load seen jobs from storage file"""
         try:
-            if os.path.exists(self.storage_file):
-                with open(self.storage_file, 'r') as f:
-                    self.seen_jobs = set(json.load(f))
-                logger.info(f"Loaded {len(self.seen_jobs)} seen jobs from storage")
+            with self._io_lock, self._file_lock(), self._lock:
+                self._load_snapshot()
+                replayed = self._replay_journal()
+            self.evict_expired()
+            
+            if len(self.seen) or self.archive:
+                archived = len(self.archive) if self.archive else 0
+                logger.info(f"Loaded {len(self.seen)} seen jobs from storage ({replayed} journal entries, "
+                            f"{archived} archived)")
             else:
                 logger.info("No existing job storage found, starting fresh")
         except Exception as e:
             logger.error(f"Error loading seen jobs: {e}")
     
+    def _load_snapshot(self):
+        """Replace the hot tier with the snapshot on disk and reopen the archive (caller holds every lock)
+        
+        Marks not journaled yet are applied on top again. Any first sighting
+        among them that the snapshot already holds was made by another process.
+        """
+        old_archive, self.archive = self.archive, SeenArchive.open(self.archive_file)
+        self._retire_archive(old_archive)
+        
+        self.seen = SeenSet()
+        self._generation = self._read_generation()
+        self._journal_offset = 0
+        if os.path.exists(self.storage_file):
+            with open(self.storage_file, 'rb') as f:
+                data = f.read()
+            
+            if data[:4] in (SNAPSHOT_MAGIC, BITMASK_SNAPSHOT_MAGIC):
+                self.seen = SeenSet.from_bytes(data)
+            else:
+                self._load_json_snapshot(json.loads(data))
+                self._needs_compaction = True
+        
+        for job_id, keywords in self._dirty.items():
+            seen_at = self._dirty_seen_at.get(job_id)
+            if not self._add_job(job_id, keywords, seen_at or time.time()) and seen_at is not None:
+                self._claim_lost(job_id)
+    
+    def _claim_lost(self, job_id):
+        """Record that another process marked a job first (caller holds the lock)"""
+        self._dirty_seen_at.pop(job_id, None)
+        self._lost.add(job_id)
+    
+    def _sync_from_disk(self):
+        """Apply what other processes wrote since this one last looked (caller holds every lock)"""
+        if self._read_generation() != self._generation:
+            self._load_snapshot()
+        self._replay_journal()
+    
+    def _load_json_snapshot(self, data):
+        """Convert a JSON snapshot written by earlier versions"""
+        now = time.time()
+        if isinstance(data, dict):
+            for job_id, record in data.items():
+                if isinstance(record, list):
+                    # Snapshots from before eviction stored only the keywords
+                    record = {'keywords': record}
+                self._add_job(job_id, record['keywords'], record.get('seen_at', now))
+        else:
+            for job_id, keywords in self._migrate_signatures(data).items():
+                self._add_job(job_id, keywords, now)
+    
+    def _replay_journal(self):
+        """Apply journal entries past the last applied offset, returning how many were read
+        
+        Caller holds every lock.
+        """
+        if not os.path.exists(self.journal_file):
+            return 0
+        
+        entries = []
+        valid_bytes = self._journal_offset
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+        
+        first_sightings = [entry['id'] for entry in entries if 'seen_at' in entry]
+        for job_id in first_sightings:
+            if job_id in self._dirty_seen_at:
+                self._claim_lost(job_id)
+        # Otherwise a job seen again after eviction starts over
+        self.seen.remove(job_key(job_id) for job_id in first_sightings
+                         if job_id not in self._dirty and job_key(job_id) in self.seen)
+        for entry in entries:
+            self._add_job(entry['id'], entry.get('keywords', ()), entry.get('seen_at', time.time()))
+        
+        # A crash mid-append can leave a torn last line; cut it off so new entries start on a clean line
+        if valid_bytes < os.path.getsize(self.journal_file):
+            logger.warning("Discarding incomplete entry at the end of the seen jobs journal")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_bytes)
+        
+        self._journal_offset = valid_bytes
+        if valid_bytes > self.compact_bytes:
+            self._needs_compaction = True
+        return len(entries)
+    
+    def _add_job(self, job_id, keywords, seen_at):
+        """Add a job or merge its keywords, returning True if it is new (caller holds the lock or is loading)"""
+        return self.seen.add(job_key(job_id), self.seen.keyword_set(keywords), seen_at)
+    
+    def _migrate_signatures(self, signatures):
+        """Convert the old list of "{job_id}_{keyword}" signatures into job ID records"""
+        seen_jobs = {}
+        for signature in signatures:
+            job_slug, _, keyword = signature.partition('_')
+            keywords = seen_jobs.setdefault(extract_job_id(job_slug), set())
+            if keyword:
+                keywords.add(keyword)
+        logger.info(f"Migrated {len(signatures)} keyword signatures to {len(seen_jobs)} job records")
+        return seen_jobs
+    
     def _save_seen_jobs(self):
-        """Save seen jobs to storage file"""
+        """Append the jobs changed since the last save to the journal and fsync it
+        
+        Returns:
+            set: IDs of jobs this process marked as new that another process
+                 had already marked; they should not be notified
+        """
         try:
-            with open(self.storage_file, 'w') as f:
-                json.dump(list(self.seen_jobs), f)
-            logger.debug(f"Saved {len(self.seen_jobs)} jobs to storage")
+            with self._io_lock, self._file_lock():
+                with self._lock:
+                    self._sync_from_disk()
+                    dirty, self._dirty = self._dirty, {}
+                    dirty_seen_at, self._dirty_seen_at = self._dirty_seen_at, {}
+                
+                if dirty:
+                    lines = ''.join(json.dumps(self._journal_entry(job_id, keywords, dirty_seen_at.get(job_id))) + '\n'
+                                    for job_id, keywords in dirty.items())
+                    with open(self.journal_file, 'a') as f:
+                        f.write(lines)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        self._journal_offset = f.tell()
+                    logger.debug(f"Journaled {len(dirty)} changed jobs")
+                journal_size = self._journal_offset
+            
+            # Evicted jobs stay on disk until compaction, so compact once they outnumber live ones
+            if (self._needs_compaction or journal_size > self.compact_bytes or self._evicted > len(self.seen)
+                    or self._archive_due()):
+                self._start_compaction()
         except Exception as e:
             logger.error(f"Error saving seen jobs: {e}")
+        
+        with self._lock:
+            lost, self._lost = self._lost, set()
+        if lost:
+            logger.info(f"Skipping {len(lost)} jobs another process already marked as seen")
+        return lost
+    
+    def _journal_entry(self, job_id, keywords, seen_at):
+        entry = {'id': job_id, 'keywords': sorted(keywords)}
+        if seen_at is not None:
+            entry['seen_at'] = seen_at
+        return entry
+    
+    def _start_compaction(self):
+        """Compact the journal into a new snapshot on a background thread"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        thread = threading.Thread(target=self._compact, name='storage-compaction')
+        thread.daemon = True
+        thread.start()
+    
+    def _archive_due(self):
+        return self.hot_max_jobs > 0 and len(self.seen) > self.hot_max_jobs
+    
+    def _merge_into_archive(self):
+        """Merge the hot tier into a new archive and drop the merged jobs from it (caller holds the I/O and file locks)
+        
+        The archive is renamed into place before the hot snapshot is rewritten,
+        so a crash in between leaves jobs in both tiers rather than in neither.
+        """
+        with self._lock:
+            hot_items = list(self.seen.items())
+            hot_keyword_sets = [self.seen.set_keywords(set_id) for set_id in range(len(self.seen.keyword_sets))]
+            archive = self.archive
+        
+        cutoff = time.time() - self.ttl if self.ttl > 0 else 0
+        archived = SeenArchive.write(self.archive_file, archive, hot_items, hot_keyword_sets, cutoff,
+                                     STORAGE_BLOOM_BITS_PER_JOB)
+        new_archive = SeenArchive(self.archive_file)
+        
+        with self._lock:
+            self.archive = new_archive
+            # Jobs that gained keywords during the merge stay hot so the new keywords aren't lost
+            self.seen.remove(key for key, set_id, _ in hot_items if self.seen.get(key) == set_id)
+            self._retire_archive(archive)
+        logger.info(f"Merged {len(hot_items)} hot jobs into the archive ({archived} archived jobs)")
+    
+    def _compact(self):
+        """Atomically rewrite the snapshot with every seen job and truncate the journal"""
+        try:
+            with self._io_lock, self._file_lock():
+                # Pick up other processes' jobs first so the snapshot covers the whole journal
+                with self._lock:
+                    self._sync_from_disk()
+                
+                if self._archive_due():
+                    self._merge_into_archive()
+                
+                with self._lock:
+                    snapshot = self.seen.to_bytes()
+                    job_count = len(self.seen)
+                    # Everything still dirty is part of this snapshot, so it needn't be journaled
+                    self._dirty = {}
+                    self._dirty_seen_at = {}
+                    self._evicted = 0
+                
+                temp_file = f"{self.storage_file}.tmp"
+                with open(temp_file, 'wb') as f:
+                    f.write(snapshot)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.storage_file)
+                
+                # A crash before this point only leaves journal entries that are already in the snapshot
+                with open(self.journal_file, 'w') as f:
+                    os.fsync(f.fileno())
+                # Tell other processes to reload the snapshot and archive
+                self._write_generation(self._generation + 1)
+                self._journal_offset = 0
+                self._needs_compaction = False
+            logger.info(f"Compacted job storage to {job_count} jobs ({len(snapshot)} bytes)")
+        except Exception as e:
+            logger.error(f"Error compacting job storage: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+    
+    def _retire_archive(self, archive):
+        """Close a replaced archive, or keep it open until iter_jobs is done with it (caller holds the lock)"""
+        if not archive:
+            return
+        if self._archive_readers:
+            self._retired_archives.append(archive)
+        else:
+            archive.close()
+    
+    def _archived_set(self, key):
+        """Return the keyword set ID of an archived job, or None (caller holds the lock)"""
+        return self.archive.get(key) if self.archive else None
+    
+    def _known_keywords(self, key):
+        """Return the keywords a job matched across both tiers, or None if it is unseen (caller holds the lock)"""
+        hot_set = self.seen.get(key)
+        archived_set = self._archived_set(key)
+        if hot_set is None and archived_set is None:
+            return None
+        
+        keywords = set()
+        if hot_set is not None:
+            keywords |= self.seen.set_keywords(hot_set)
+        if archived_set is not None:
+            keywords |= self.archive.set_keywords(archived_set)
+        return keywords
     
     def is_job_seen(self, job_id):
         """Check if a job has been seen before"""
-        return job_id in self.seen_jobs
+        key = job_key(job_id)
+        with self._lock:
+            return key in self.seen or self._archived_set(key) is not None
     
-    def mark_job_seen(self, job_id):
-        """Mark a job as seen"""
-        if job_id not in self.seen_jobs:
-            self.seen_jobs.add(job_id)
-            # We'll save at the end of the job check cycle instead of after each job
-            # This reduces file I/O and prevents race conditions
+    def mark_job_seen(self, job_id, keywords=()):
+        """Mark a job as seen and record the keywords it matched
+        
+        Returns:
+            bool: True if the job was not seen before, so exactly one caller
+                  wins when parallel searches find the same job
+        """
+        with self._lock:
+            known_keywords = self._known_keywords(job_key(job_id))
+            is_new = known_keywords is None
+            # An archived job that matches new keywords gets a hot entry holding just those
+            added_keywords = set(keywords) - (known_keywords or set())
+            if is_new or added_keywords:
+                seen_at = time.time()
+                self._add_job(job_id, added_keywords, seen_at)
+                if is_new:
+                    self._dirty_seen_at[job_id] = seen_at
+                # We'll journal the change at the end of the job check cycle instead of after each job
+                # This reduces file I/O and prevents race conditions
+                self._dirty.setdefault(job_id, set()).update(added_keywords)
+            return is_new
+    
+    def marked_this_cycle(self, job_id):
+        """Check if a job was first seen in this check cycle, i.e. by a mark not saved yet"""
+        with self._lock:
+            return job_id in self._dirty_seen_at
+    
+    def unmark_jobs(self, job_ids):
+        """Undo this cycle's marks of new jobs that aren't saved yet, so they are found as new again"""
+        with self._lock:
+            unmarked = [job_id for job_id in job_ids if self._dirty_seen_at.pop(job_id, None) is not None]
+            for job_id in unmarked:
+                self._dirty.pop(job_id, None)
+            self.seen.remove(job_key(job_id) for job_id in unmarked)
+    
+    def record_jobs(self, jobs):
+        """Store full job records (the file backend only keeps job IDs and keywords)"""
+    
+    def get_recent_jobs(self, limit):
+        """Return stored job records, newest first (none for the file backend)"""
+        return []
+    
+    def get_job_keywords(self, job_id):
+        """Return the set of keywords a seen job has matched"""
+        with self._lock:
+            return self._known_keywords(job_key(job_id)) or set()
     
     def get_seen_count(self):
-        """Return the number of seen jobs"""
-        return len(self.seen_jobs)
+        """Return the number of seen jobs (archived jobs touched again since are counted twice)"""
+        return len(self.seen) + (len(self.archive) if self.archive else 0)
+    
+    def iter_jobs(self):
+        """Yield (job ID, keywords, first seen time) for every archived job, then every hot job
+        
+        Non-numeric IDs are stored hashed, so they come back as their key.
+        """
+        with self._lock:
+            items = list(self.seen.items())
+            archive = self.archive
+            # The archive is read without the lock, so a compaction must not close it meanwhile
+            self._archive_readers += 1
+        try:
+            if archive:
+                for key, set_id, seen_at in archive.items():
+                    yield str(key), archive.set_keywords(set_id), seen_at
+        finally:
+            with self._lock:
+                self._archive_readers -= 1
+                if not self._archive_readers:
+                    retired, self._retired_archives = self._retired_archives, []
+                    for old_archive in retired:
+                        old_archive.close()
+        for key, set_id, seen_at in items:
+            yield str(key), self.seen.set_keywords(set_id), seen_at
+    
+    def evict_expired(self):
+        """Forget jobs first seen longer ago than the TTL, returning how many were evicted
+        
+        Runs in time proportional to the number of evicted jobs. They are
+        dropped from the files at the next compaction.
+        """
+        if self.ttl <= 0:
+            return 0
+        
+        with self._lock:
+            evicted = self.seen.pop_expired(time.time() - self.ttl)
+            self._evicted += evicted
+        
+        if evicted:
+            logger.info(f"Evicted {evicted} jobs first seen more than {self.ttl / 86400:g} days ago")
+        return evicted
     
     def clear_old_jobs(self, max_jobs=1000):
-        """Clear out old jobs if we're storing too many"""
-        if len(self.seen_jobs) > max_jobs:
-            # Convert to list, sort by job ID (which often contains timestamps) and keep the newest
-            jobs_list = list(self.seen_jobs)
-            # Try to keep the newest jobs based on numeric sorting
+        """Clear out old jobs if we're storing too many (in the hot tier; the archive is trimmed by TTL)"""
+        if len(self.seen) > max_jobs:
+            # Sort by job ID (LinkedIn IDs increase over time) and keep the newest
             try:
-                sorted_jobs = sorted(jobs_list, key=lambda x: int(x) if x.isdigit() else 0, reverse=True)
-                self.seen_jobs = set(sorted_jobs[:max_jobs])
-                self._save_seen_jobs()
+                with self._lock:
+                    sorted_keys = sorted((key for key, _, _ in self.seen.items()), reverse=True)
+                    self.seen.remove(sorted_keys[max_jobs:])
+                # Removals can't be journaled, so rewrite the snapshot
+                self._compact()
                 logger.info(f"Cleaned job storage, keeping {max_jobs} most recent jobs")
             except Exception as e:
                 logger.error(f"Error cleaning job storage: {e}")
+    
+    def close(self):
+        """Release the lock file and the archive mapping (changes not saved yet are dropped)"""
+        # Wait for a running compaction, which uses both
+        with self._io_lock, self._lock:
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+            self._retire_archive(self.archive)
+            self.archive = None
+
+def create_job_storage(backend=STORAGE_BACKEND):
+    """Create the seen job storage for the configured backend"""
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteJobStorage
+        return SQLiteJobStorage()
+    if backend != 'file':
+        logger.warning(f"Unknown storage backend '{backend}', using the file backend")
+    return JobStorage()
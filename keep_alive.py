@@ -1,12 +1,15 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 import os
 import datetime
 import threading
-import time
 from logger import logger
-from config import CHECK_INTERVAL, KEYWORDS, TELEGRAM_BOT_TOKEN
-from send_test_message import send_welcome_messages_to_new_users
+from config import CHECK_INTERVAL, KEYWORDS, TELEGRAM_BOT_TOKEN, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET
+from telegram_updates import update_consumer
+from telegram_webhook import webhook_receiver, WEBHOOK_PATH, SECRET_HEADER
 from app_state import app_state, update_state
+from http_client import http_client
+from rate_limiter import rate_limiter
+from telegram_dispatcher import telegram_dispatcher
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "linkedin-job-scraper")
@@ -37,13 +40,21 @@ def home():
 @app.route('/api/status')
 def status():
     """Return application status as JSON for API clients"""
+    from job_checker import job_checker
     return jsonify({
         "status": "online" if app_state["running"] else "paused",
         "last_check": app_state["last_check"].isoformat() if app_state["last_check"] else None,
         "next_check": app_state["next_check"].isoformat() if app_state["next_check"] else None,
         "jobs_found": app_state["jobs_found"],
         "uptime_seconds": (datetime.datetime.now() - app_state["start_time"]).total_seconds(),
-        "keywords": KEYWORDS
+        "keywords": KEYWORDS,
+        "http": http_client.get_stats(),
+        "rate_limits": rate_limiter.get_stats(),
+        "scheduler": job_checker.poll_scheduler.get_stats(),
+        "telegram": telegram_dispatcher.get_stats(),
+        "notifications": job_checker.delivery_worker.get_stats(),
+        "updates": update_consumer.get_stats(),
+        "webhook": webhook_receiver.get_stats() if webhook_receiver.running else None
     })
 
 @app.route('/ping')
@@ -70,30 +81,32 @@ def send_test():
         "message": "Test message sent successfully" if success else "Failed to send test message"
     })
 
-def telegram_welcome_checker():
-    """Periodically check for new Telegram users and send welcome messages"""
-    # Only run if Telegram is configured
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    """Accept an update pushed by Telegram and queue it for the webhook workers"""
+    if not webhook_receiver.running:
+        return "webhook not enabled", 404
+    status_code, text = webhook_receiver.receive(request.headers.get(SECRET_HEADER),
+                                                 request.get_data(cache=False, as_text=True))
+    return text, status_code
+
+def start_telegram_updates():
+    """Receive bot updates through the webhook if one is configured, otherwise by long polling"""
     if not TELEGRAM_BOT_TOKEN:
-        logger.warning("Telegram bot token not configured, welcome checker not started")
+        logger.warning("Telegram bot token not configured, not listening for updates")
         return
-        
-    logger.info("Starting Telegram welcome message checker")
-    
-    # Run this check every 10 minutes
-    WELCOME_CHECK_INTERVAL = 600  # 10 minutes in seconds
-    
-    while True:
-        try:
-            # Check for new users and send welcome messages
-            logger.info("Checking for new Telegram users...")
-            send_welcome_messages_to_new_users()
-            
-            # Sleep until next check
-            time.sleep(WELCOME_CHECK_INTERVAL)
-        except Exception as e:
-            logger.error(f"Error in Telegram welcome checker: {e}")
-            # Still sleep before retrying to avoid spamming logs
-            time.sleep(60)  # Wait 1 minute before retrying after error
+    if TELEGRAM_WEBHOOK_URL:
+        if not TELEGRAM_WEBHOOK_SECRET:
+            logger.error("TELEGRAM_WEBHOOK_SECRET must be set to use the webhook, falling back to polling")
+        else:
+            webhook_receiver.start()
+            if webhook_receiver.set_webhook():
+                return
+            webhook_receiver.stop()
+            logger.error("Falling back to polling for Telegram updates")
+    # A webhook set by an earlier run in webhook mode would make every getUpdates call fail
+    webhook_receiver.delete_webhook()
+    update_consumer.start()
 
 def keep_alive():
     """Start the Flask server in a background thread"""
@@ -106,10 +119,8 @@ def keep_alive():
     # Update initial state
     update_state()
     
-    # Start the Telegram welcome checker in a separate thread
-    welcome_thread = threading.Thread(target=telegram_welcome_checker)
-    welcome_thread.daemon = True
-    welcome_thread.start()
+    # Answer /start and other bot commands as they arrive
+    start_telegram_updates()
     
     # Start the job checker
     from job_checker import start_job_checker
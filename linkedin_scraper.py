@@ -1,149 +1,255 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
+import codecs
+import datetime
 from urllib.parse import quote
-from config import LINKEDIN_HEADERS, REMOTE_ONLY, DAYS_RECENT, LOCATION
+from config import (LINKEDIN_HEADERS, PAGINATED_SEARCH, MAX_PAGES_PER_KEYWORD,
+                    HTML_PARSER, LINKEDIN_MAX_RETRIES, STREAM_SEARCH_RESULTS, STREAM_CHUNK_SIZE,
+                    STREAM_STOP_AFTER_SEEN)
+from job_parser import get_parser, StreamingJobCardParser
+from job_storage import extract_job_id
+from query_planner import QueryUnit
+from http_client import http_client
+from rate_limiter import rate_limiter
 from logger import logger
 
+# LinkedIn's guest endpoint that serves search results in pages of job cards
+GUEST_SEARCH_URL = 'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search'
+
 class LinkedInScraper:
     """Class to scrape LinkedIn job listings"""
     
     def __init__(self, job_storage):
         self.job_storage = job_storage
         self.first_run = True  # Flag to track first run
+        self.parser = get_parser(HTML_PARSER)
+        self.stream_parser = StreamingJobCardParser()
     
-    def _build_search_url(self, keyword):
-        """Build LinkedIn job search URL with parameters"""
+    def _build_search_params(self, query):
+        """Build the LinkedIn job search query string for a QueryUnit"""
         # URL encode the keyword
-        encoded_keyword = quote(keyword)
-        encoded_location = quote(LOCATION)
+        encoded_keyword = quote(query.query)
+        encoded_location = quote(query.location)
         
-        # Base URL
-        url = f'https://www.linkedin.com/jobs/search/?keywords={encoded_keyword}&location={encoded_location}'
+        params = f'keywords={encoded_keyword}&location={encoded_location}'
         
         # Add remote work filter if enabled
-        if REMOTE_ONLY:
-            url += '&f_WT=2'
+        if query.remote_only:
+            params += '&f_WT=2'
         
-        # Add time filter based on configuration
-        if DAYS_RECENT == 1:
-            url += '&f_TPR=r86400'  # Last 24 hours
-        elif DAYS_RECENT == 7:
-            url += '&f_TPR=r604800'  # Last 7 days
-        elif DAYS_RECENT == 30:
-            url += '&f_TPR=r2592000'  # Last month
+        # Add time filter based on configuration (LinkedIn takes any window in seconds, e.g. r86400 for 24 hours)
+        if query.days_recent > 0:
+            params += f'&f_TPR=r{int(query.days_recent * 86400)}'
         
         # Sort by most recent
-        url += '&sortBy=DD'
+        params += '&sortBy=DD'
         
-        return url
+        return params
     
-    def get_jobs(self, keyword):
-        """Scrape LinkedIn for jobs matching the keyword"""
-        search_url = self._build_search_url(keyword)
-        logger.debug(f"Searching LinkedIn: {search_url}")
-        
-        try:
-            # Add a small random delay to avoid rate limiting
-            time.sleep(random.uniform(1, 3))
+    def _build_search_url(self, query):
+        """Build LinkedIn job search URL with parameters"""
+        return f'https://www.linkedin.com/jobs/search/?{self._build_search_params(query)}'
+    
+    def _build_page_url(self, query, start):
+        """Build the guest endpoint URL for the results page starting at the given offset"""
+        return f'{GUEST_SEARCH_URL}?{self._build_search_params(query)}&start={start}'
+    
+    def _request_page(self, url, stream=False):
+        """Request a results page, retrying throttled requests, or return None if it failed"""
+        for attempt in range(LINKEDIN_MAX_RETRIES + 1):
+            # Wait for the shared per-host budget instead of a fixed random delay
+            rate_limiter.acquire(url)
             
             # Request the search page
-            response = requests.get(search_url, headers=LINKEDIN_HEADERS)
+            response = http_client.get(url, headers=LINKEDIN_HEADERS, stream=stream)
             
-            if response.status_code != 200:
-                logger.error(f"LinkedIn returned status code {response.status_code}")
-                return []
+            if not rate_limiter.record_response(url, response):
+                break
+            response.close()
+            if attempt < LINKEDIN_MAX_RETRIES:
+                logger.info(f"Retrying throttled LinkedIn request (attempt {attempt + 2} of {LINKEDIN_MAX_RETRIES + 1})")
+        
+        if response.status_code != 200:
+            logger.error(f"LinkedIn returned status code {response.status_code}")
+            response.close()
+            return None
+        
+        return response
+    
+    def _search_page(self, url, query):
+        """Fetch one results page and turn its cards into new jobs
+        
+        Returns:
+            tuple: (list of new job dicts, number of unseen cards, number of cards read,
+                    whether the seen-job boundary was reached), or None if the request failed
+        """
+        if STREAM_SEARCH_RESULTS:
+            return self._stream_page(url, query)
+        
+        response = self._request_page(url)
+        if response is None:
+            return None
+        
+        # Parse the HTML content
+        job_cards = self.parser.parse(response.text)
+        jobs, unseen_count = self._process_job_cards(job_cards, query)
+        return jobs, unseen_count, len(job_cards), unseen_count == 0
+    
+    def _stream_page(self, url, query):
+        """Parse a results page while it downloads, stopping at a run of already-seen jobs
+        
+        Results are sorted newest first, so once STREAM_STOP_AFTER_SEEN cards in a
+        row are already known the rest of the page is too, and the connection is
+        closed without reading it.
+        """
+        response = self._request_page(url, stream=True)
+        if response is None:
+            return None
+        
+        jobs = []
+        unseen_total = 0
+        card_count = 0
+        seen_run = 0
+        stopped_early = False
+        card_stream = self.stream_parser.start_stream()
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                for job_card in card_stream.feed_cards(decoder.decode(chunk)):
+                    card_count += 1
+                    card_jobs, unseen_count = self._process_job_cards([job_card], query)
+                    jobs.extend(card_jobs)
+                    unseen_total += unseen_count
+                    seen_run = 0 if unseen_count else seen_run + 1
+                    
+                    if seen_run >= STREAM_STOP_AFTER_SEEN:
+                        stopped_early = True
+                        break
+                if stopped_early:
+                    logger.debug(f"Stopped reading {query} results after {card_count} cards at a run of seen jobs")
+                    break
+            else:
+                card_stream.feed(decoder.decode(b'', final=True))
+                card_stream.close()
+                for job_card in card_stream.pop_cards():
+                    card_count += 1
+                    card_jobs, unseen_count = self._process_job_cards([job_card], query)
+                    jobs.extend(card_jobs)
+                    unseen_total += unseen_count
+        finally:
+            # Closing an unfinished stream drops the connection instead of reading the rest
+            response.close()
+        
+        return jobs, unseen_total, card_count, stopped_early or unseen_total == 0
+    
+    def _process_job_cards(self, job_cards, query):
+        """Turn parsed job cards into job dicts, marking unseen jobs as seen
+        
+        Returns:
+            tuple: (list of new job dicts, number of cards that were not known before this check cycle)
+        """
+        jobs = []
+        unseen_count = 0
+        
+        for job_card in job_cards:
+            try:
+                job_link = job_card['link']
+                
+                # Key jobs by their LinkedIn ID so a posting matching several keywords is stored once
+                job_id = extract_job_id(job_link)
+                keywords = query.attribute(job_card)
+                
+                # Marking is an atomic check-and-set, so if this job was already seen
+                # (in storage, earlier in this batch or by a parallel search) we only
+                # record the extra keywords it matched
+                if not self.job_storage.mark_job_seen(job_id, keywords):
+                    # A job another query found earlier in this cycle says nothing about where this
+                    # query's already-seen results begin, so only jobs known before the cycle count
+                    if self.job_storage.marked_this_cycle(job_id):
+                        unseen_count += 1
+                    logger.debug(f"Skipping already seen job: {job_id}")
+                    continue
                 
-            # Parse the HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
+                unseen_count += 1
+                
+                # On first run, we just mark jobs as seen without returning them
+                # This prevents notifications for existing jobs when the app first starts
+                if self.first_run:
+                    continue
+                
+                # Add job to results with current timestamp
+                jobs.append({
+                    'id': job_link.split('/')[-1].strip(),
+                    'signature': job_id,
+                    'title': job_card['title'],
+                    'company': job_card['company'],
+                    'location': job_card['location'],
+                    'link': job_link,
+                    'posted_time': job_card['posted_time'],
+                    'keyword': keywords[0],
+                    'keywords': keywords,
+                    'timestamp': datetime.datetime.now()
+                })
             
-            # Find job listings
-            jobs = []
-            marked_job_count = 0
+            except Exception as e:
+                logger.error(f"Error processing job card: {e}")
+        
+        return jobs, unseen_count
+    
+    def _get_paginated_job_cards(self, query):
+        """Walk the guest endpoint page by page until a page holds no unseen jobs
+        
+        Results are sorted newest first, so once a whole page is made up of jobs
+        we already know, every later page is known too and we can stop early.
+        """
+        jobs = []
+        unseen_total = 0
+        start = 0
+        
+        for page in range(MAX_PAGES_PER_KEYWORD):
+            result = self._search_page(self._build_page_url(query, start), query)
+            if result is None or result[2] == 0:
+                # Failed request or no more results
+                break
             
-            # Track job IDs we've already processed in this batch to avoid duplicates
-            batch_job_ids = set()
+            page_jobs, unseen_count, card_count, reached_seen = result
+            jobs.extend(page_jobs)
+            unseen_total += unseen_count
             
-            for job_card in soup.find_all('div', {'class': 'base-card'}):
-                try:
-                    # Find job title link
-                    job_link_elem = job_card.find('a', {'class': 'base-card__full-link'})
-                    if not job_link_elem:
-                        continue
-                        
-                    job_link = job_link_elem['href'].split('?')[0]  # Remove query parameters
-                    job_title = job_link_elem.text.strip()
-                    
-                    # Extract job ID from the URL - make sure to normalize the ID
-                    job_id = job_link.split('/')[-1].strip()
-                    
-                    # Create a unique job signature for this job and keyword
-                    # This prevents the same job from showing up for different keywords
-                    job_signature = f"{job_id}_{keyword}"
-                    
-                    # Skip if we've seen this job before in storage
-                    if self.job_storage.is_job_seen(job_signature):
-                        logger.debug(f"Skipping already seen job: {job_signature}")
-                        continue
-                        
-                    # Skip if we've already processed this job ID in this batch
-                    if job_signature in batch_job_ids:
-                        logger.debug(f"Skipping duplicate job ID in current batch: {job_signature}")
-                        continue
-                    
-                    # Add to current batch tracking
-                    batch_job_ids.add(job_signature)
-                    
-                    # Try to get company name
-                    company_elem = job_card.find('span', {'class': 'base-search-card__subtitle'})
-                    company = company_elem.text.strip() if company_elem else "Unknown Company"
-                    
-                    # Try to get location
-                    location_elem = job_card.find('span', {'class': 'job-search-card__location'})
-                    location = location_elem.text.strip() if location_elem else "Remote"
-                    
-                    # Get posting time
-                    time_elem = job_card.find('time', {'class': 'job-search-card__listdate'})
-                    if time_elem and 'datetime' in time_elem.attrs:
-                        posted_time = time_elem['datetime']
-                    else:
-                        posted_time = "Recently"
-                    
-                    # Mark the job as seen using the job signature
-                    self.job_storage.mark_job_seen(job_signature)
-                    marked_job_count += 1
-                    
-                    # On first run, we just mark jobs as seen without returning them
-                    # This prevents notifications for existing jobs when the app first starts
-                    if self.first_run:
-                        continue
-                    
-                    # Add job to results with current timestamp
-                    import datetime
-                    jobs.append({
-                        'id': job_id,
-                        'signature': job_signature,
-                        'title': job_title,
-                        'company': company,
-                        'location': location,
-                        'link': job_link,
-                        'posted_time': posted_time,
-                        'keyword': keyword,
-                        'timestamp': datetime.datetime.now()
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Error parsing job card: {e}")
+            if reached_seen:
+                logger.debug(f"Reached seen-job boundary for {query} on page {page + 1}")
+                break
+            
+            start += card_count
+        else:
+            logger.warning(f"Stopped after {MAX_PAGES_PER_KEYWORD} pages for {query} without reaching seen jobs")
+        
+        return jobs, unseen_total
+    
+    def get_jobs(self, query):
+        """Scrape LinkedIn for jobs matching a keyword or a planned QueryUnit"""
+        if not isinstance(query, QueryUnit):
+            query = QueryUnit([query])
+        
+        try:
+            if PAGINATED_SEARCH:
+                jobs, marked_job_count = self._get_paginated_job_cards(query)
+            else:
+                search_url = self._build_search_url(query)
+                logger.debug(f"Searching LinkedIn: {search_url}")
+                
+                result = self._search_page(search_url, query)
+                if result is None:
+                    return []
+                jobs, marked_job_count = result[:2]
             
             if self.first_run:
-                logger.info(f"First run: Marked {marked_job_count} existing {keyword} jobs as seen (no notifications sent)")
+                logger.info(f"First run: Marked {marked_job_count} existing {query} jobs as seen (no notifications sent)")
                 # We'll reset first_run flag in the JobChecker after all keywords have been processed
                 return []  # Return empty list on first run
             else:
-                logger.info(f"Found {len(jobs)} new {keyword} jobs")
+                logger.info(f"Found {len(jobs)} new {query} jobs")
                 return jobs
-            
+        
         except Exception as e:
             logger.error(f"Error scraping LinkedIn: {e}")
             return []
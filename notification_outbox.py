@@ -0,0 +1,364 @@
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import wait
+from config import (NOTIFY_OUTBOX_FILE, NOTIFY_LEASE_SECONDS, NOTIFY_MAX_ATTEMPTS, NOTIFY_BATCH_SIZE,
+                    NOTIFY_DEAD_CHAT_FAILURES, STORAGE_TTL_DAYS)
+from logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    job_id TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claims INTEGER NOT NULL DEFAULT 1,
+    next_attempt REAL NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+CREATE TABLE IF NOT EXISTS deliveries (
+    job_id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    PRIMARY KEY (job_id, chat_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chat_stats (
+    chat_id TEXT PRIMARY KEY,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    last_success REAL,
+    last_failure REAL
+);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses the prepared versions
+INSERT_JOB = """
+INSERT INTO outbox (job_id, job, next_attempt, created) VALUES (?, ?, ?, ?)
+ON CONFLICT (job_id) DO UPDATE SET claims = claims + 1 WHERE status = 'pending'
+RETURNING created
+"""
+SELECT_DUE = """
+SELECT job_id, job, attempts FROM outbox WHERE status = 'pending' AND next_attempt <= ?
+ORDER BY created LIMIT ?
+"""
+LEASE_JOB = "UPDATE outbox SET next_attempt = ?, attempts = attempts + 1 WHERE job_id = ?"
+MARK_DELIVERED = "UPDATE outbox SET status = 'delivered', finished = ? WHERE job_id = ?"
+MARK_RETRY = "UPDATE outbox SET next_attempt = ? WHERE job_id = ?"
+MARK_FAILED = "UPDATE outbox SET status = 'failed', finished = ? WHERE job_id = ?"
+RELEASE_JOB = "UPDATE outbox SET next_attempt = 0, attempts = max(attempts - 1, 0) WHERE job_id = ?"
+UNCLAIM_JOB = "UPDATE outbox SET claims = claims - 1 WHERE job_id = ? AND status = 'pending'"
+DELETE_UNCLAIMED_JOB = "DELETE FROM outbox WHERE job_id = ? AND status = 'pending' AND claims <= 0 AND attempts = 0"
+DELETE_ORPHAN_DELIVERIES = "DELETE FROM deliveries WHERE job_id = ? AND job_id NOT IN (SELECT job_id FROM outbox)"
+COUNT_BY_STATUS = "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+SELECT_DELIVERED_CHATS = "SELECT chat_id FROM deliveries WHERE job_id = ? AND delivered = 1"
+RECORD_DELIVERY = """
+INSERT INTO deliveries (job_id, chat_id, delivered, attempts, updated) VALUES (?, ?, ?, 1, ?)
+ON CONFLICT (job_id, chat_id) DO UPDATE SET
+    delivered = max(delivered, excluded.delivered), attempts = attempts + 1, updated = excluded.updated
+"""
+RECORD_CHAT_SUCCESS = """
+INSERT INTO chat_stats (chat_id, sent, last_success) VALUES (?, 1, ?)
+ON CONFLICT (chat_id) DO UPDATE SET sent = sent + 1, consecutive_failures = 0, last_success = excluded.last_success
+"""
+RECORD_CHAT_FAILURE = """
+INSERT INTO chat_stats (chat_id, failed, consecutive_failures, last_failure) VALUES (?, 1, 1, ?)
+ON CONFLICT (chat_id) DO UPDATE SET
+    failed = failed + 1, consecutive_failures = consecutive_failures + 1, last_failure = excluded.last_failure
+RETURNING consecutive_failures
+"""
+SELECT_CHAT_STATS = "SELECT chat_id, sent, failed, consecutive_failures, last_success, last_failure FROM chat_stats"
+
+# Longest wait between delivery attempts of one job, in seconds
+MAX_RETRY_DELAY = 600
+
+class NotificationOutbox:
+    """Durable queue of jobs waiting to be notified, kept in SQLite
+    
+    Jobs are added by the scrape stage and handed to the delivery worker in
+    batches. Handing out a batch leases its jobs: they are hidden for
+    lease_seconds and reappear if the worker doesn't report back in time, so a
+    crash or restart mid-delivery means the job is sent again rather than lost
+    (at-least-once). Rows are keyed by job ID and kept for a while after
+    delivery, so a job that is found again after a crash isn't re-queued.
+    
+    Processes sharing the outbox file share its rows: each add of a pending
+    job counts a claim on it, and a discard only drops the row once no claim
+    is left and the delivery worker hasn't picked it up yet.
+    
+    A ledger alongside records which chats each job has reached, so a retry
+    only goes to the chats that are still missing it, and keeps send
+    counters per chat to show which chats keep failing.
+    """
+    
+    def __init__(self, db_file=NOTIFY_OUTBOX_FILE, lease_seconds=NOTIFY_LEASE_SECONDS,
+                 max_attempts=NOTIFY_MAX_ATTEMPTS, retention_days=STORAGE_TTL_DAYS,
+                 dead_chat_failures=NOTIFY_DEAD_CHAT_FAILURES):
+        self.db_file = db_file
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.dead_chat_failures = dead_chat_failures
+        self.retention = retention_days * 24 * 3600
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self._init_db()
+    
+    def _init_db(self):
+        try:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+            if 'claims' not in columns:
+                with self.conn:
+                    self.conn.execute("ALTER TABLE outbox ADD COLUMN claims INTEGER NOT NULL DEFAULT 1")
+            pending = self.get_stats().get('pending', 0)
+            if pending:
+                logger.info(f"Recovered {pending} undelivered notifications from {self.db_file}")
+        except Exception as e:
+            logger.error(f"Error initializing notification outbox: {e}")
+    
+    def add(self, jobs):
+        """Durably queue jobs for notification, returning how many were new to the outbox
+        
+        A job already pending, e.g. queued by another process, gets one more claim instead.
+        """
+        now = time.time()
+        rows = [(job['signature'], json.dumps(job, default=str), now, now) for job in jobs]
+        with self._lock, self.conn:
+            created = [self.conn.execute(INSERT_JOB, row).fetchall() for row in rows]
+            return sum(1 for returned in created if returned and returned[0][0] == now)
+    
+    def discard(self, job_ids):
+        """Give up this process's claim on queued jobs that turned out not to need its notification
+        
+        A job is only dropped once no process that queued it still claims it,
+        so another process relying on the same row still gets it sent.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(UNCLAIM_JOB, ((job_id,) for job_id in job_ids))
+            self.conn.executemany(DELETE_UNCLAIMED_JOB, ((job_id,) for job_id in job_ids))
+            self.conn.executemany(DELETE_ORPHAN_DELIVERIES, ((job_id,) for job_id in job_ids))
+    
+    def lease(self, limit=NOTIFY_BATCH_SIZE):
+        """Hand out up to limit due jobs, hiding them from other workers until the lease expires
+        
+        Returns:
+            list: (job dict, attempt number) pairs, oldest first
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            # Take the write lock up front so two processes can't lease the same rows
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(SELECT_DUE, (now, limit)).fetchall()
+            self.conn.executemany(LEASE_JOB, ((now + self.lease_seconds, job_id) for job_id, _, _ in rows))
+        return [(json.loads(job), attempts + 1) for _, job, attempts in rows]
+    
+    def complete(self, delivered, failed):
+        """Record the outcome of a leased batch
+        
+        Args:
+            delivered (list): Job IDs that reached Telegram
+            failed (list): (job ID, attempt number) pairs to retry with backoff,
+                           or give up on once max_attempts is reached
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(MARK_DELIVERED, ((now, job_id) for job_id in delivered))
+            for job_id, attempt in failed:
+                if attempt >= self.max_attempts:
+                    logger.error(f"Giving up on notifying job {job_id} after {attempt} attempts")
+                    self.conn.execute(MARK_FAILED, (now, job_id))
+                else:
+                    self.conn.execute(MARK_RETRY, (now + min(MAX_RETRY_DELAY, 5 * 2 ** attempt), job_id))
+    
+    def release(self, job_ids):
+        """Make leased jobs due again right away without using up an attempt, e.g. when cut short by shutdown"""
+        with self._lock, self.conn:
+            self.conn.executemany(RELEASE_JOB, ((job_id,) for job_id in job_ids))
+    
+    def prune(self):
+        """Forget finished jobs older than the retention period"""
+        if self.retention <= 0:
+            return 0
+        cutoff = time.time() - self.retention
+        with self._lock, self.conn:
+            pruned = self.conn.execute("DELETE FROM outbox WHERE status != 'pending' AND finished < ?",
+                                       (cutoff,)).rowcount
+            self.conn.execute("DELETE FROM deliveries WHERE job_id NOT IN (SELECT job_id FROM outbox)")
+            return pruned
+    
+    def pending_chats(self, recipients):
+        """Return job ID -> the chats each job is routed to that haven't received it yet"""
+        with self._lock:
+            pending = {}
+            for job_id, chat_ids in recipients.items():
+                delivered = {row[0] for row in self.conn.execute(SELECT_DELIVERED_CHATS, (job_id,))}
+                pending[job_id] = [chat_id for chat_id in chat_ids if chat_id not in delivered]
+            return pending
+    
+    def record_deliveries(self, outcomes, messages):
+        """Write send outcomes to the ledger
+        
+        Args:
+            outcomes (list): (job ID, chat ID, delivered) for every job and chat attempted
+            messages (list): (chat ID, delivered) for every message sent, for the per-chat counters
+        """
+        now = time.time()
+        dead_chats = set()
+        with self._lock, self.conn:
+            self.conn.executemany(RECORD_DELIVERY, ((job_id, chat_id, int(delivered), now)
+                                                    for job_id, chat_id, delivered in outcomes))
+            for chat_id, delivered in messages:
+                if delivered:
+                    self.conn.execute(RECORD_CHAT_SUCCESS, (chat_id, now))
+                else:
+                    failures = self.conn.execute(RECORD_CHAT_FAILURE, (chat_id, now)).fetchone()[0]
+                    if failures == self.dead_chat_failures:
+                        dead_chats.add(chat_id)
+        
+        for chat_id in dead_chats:
+            logger.warning(f"Chat {chat_id} has failed {self.dead_chat_failures} notifications in a row; "
+                           f"consider removing it from TELEGRAM_CHAT_IDS")
+    
+    def get_chat_stats(self):
+        """Return send counters and success rate for every chat notified so far"""
+        with self._lock:
+            rows = self.conn.execute(SELECT_CHAT_STATS).fetchall()
+        
+        chats = {}
+        for chat_id, sent, failed, consecutive_failures, last_success, last_failure in rows:
+            chats[chat_id] = {
+                'sent': sent,
+                'failed': failed,
+                'success_rate': round(sent / (sent + failed), 3) if sent + failed else None,
+                'consecutive_failures': consecutive_failures,
+                'last_success': last_success,
+                'last_failure': last_failure,
+                'dead': consecutive_failures >= self.dead_chat_failures
+            }
+        return chats
+    
+    def get_stats(self):
+        """Return the number of jobs in each state"""
+        with self._lock:
+            return dict(self.conn.execute(COUNT_BY_STATUS).fetchall())
+
+class DeliveryWorker:
+    """Background thread that drains the outbox through the Telegram notifier
+    
+    Runs independently of the scrape loop, so a slow or unreachable Telegram
+    never holds up the next check.
+    """
+    
+    def __init__(self, outbox, notifier, batch_size=NOTIFY_BATCH_SIZE, poll_interval=5):
+        self.outbox = outbox
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+        self.stats = {'delivered': 0, 'retried': 0}
+    
+    def notify(self):
+        """Wake the worker up because new jobs were queued"""
+        self._wakeup.set()
+    
+    def start(self):
+        """Start the delivery thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='notification-delivery', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Ask the worker to stop after the batch it is sending"""
+        self.running = False
+        self._wakeup.set()
+    
+    def join(self, timeout=10):
+        if self.thread:
+            self.thread.join(timeout=timeout)
+    
+    def _run(self):
+        last_prune = 0
+        while self.running:
+            try:
+                delivered = self.deliver_due()
+                if time.time() - last_prune > 3600:
+                    self.outbox.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                logger.error(f"Error delivering notifications: {e}", exc_info=True)
+                delivered = 0
+            
+            # Go straight on to the next batch while there is a backlog
+            if not delivered:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+    
+    def deliver_due(self):
+        """Send one batch of due jobs and record the outcome, returning the number of jobs handled
+        
+        Each job only goes to the chats the ledger says are still missing it.
+        A job is done once every chat it is routed to has it; jobs some chats
+        failed to get are retried for those chats alone.
+        """
+        # A shut down dispatcher fails every send without trying, so leave the jobs queued until it is back
+        if self.notifier.dispatcher.closed:
+            return 0
+        leased = self.outbox.lease(self.batch_size)
+        if not leased:
+            return 0
+        
+        jobs = [job for job, _ in leased]
+        chat_ids = self.notifier.chat_ids()
+        pending = self.outbox.pending_chats(self.notifier.route_jobs(jobs))
+        deliveries = self.notifier.queue_jobs(jobs, recipients=pending)
+        wait([future for _, _, future in deliveries])
+        # Sends that failed because of a shutdown were never attempted, so they count against neither job nor chat.
+        # The dispatcher is marked closed before it fails its queued sends, so this sees every such failure
+        cut_short = self.notifier.dispatcher.closed
+        
+        outcomes = []
+        messages = []
+        for chat_id, batch_jobs, future in deliveries:
+            delivered = future.result()
+            if cut_short and not delivered:
+                continue
+            messages.append((chat_id, delivered))
+            outcomes.extend((job['signature'], chat_id, delivered) for job in batch_jobs)
+        self.outbox.record_deliveries(outcomes, messages)
+        
+        reached = {(job_id, chat_id) for job_id, chat_id, delivered in outcomes if delivered}
+        missing = {job_id for job_id, chats in pending.items()
+                   if any((job_id, chat_id) not in reached for chat_id in chats)}
+        if not chat_ids:
+            # Nothing can be delivered until Telegram is configured
+            missing = {job['signature'] for job in jobs}
+        done = [job['signature'] for job in jobs if job['signature'] not in missing]
+        
+        if cut_short:
+            # Sends cut short by shutdown go out again after the restart
+            self.outbox.release(missing)
+            self.outbox.complete(done, [])
+            return 0
+        
+        failed = [(job['signature'], attempt) for job, attempt in leased if job['signature'] in missing]
+        self.outbox.complete(done, failed)
+        self.stats['delivered'] += len(done)
+        self.stats['retried'] += len(failed)
+        if failed:
+            logger.warning(f"{len(failed)} notifications did not reach every chat and will be retried for the rest")
+        logger.info(f"Delivered notifications for {len(done)} of {len(jobs)} jobs")
+        return len(jobs)
+    
+    def get_stats(self):
+        """Return outbox counts, delivery counters and per-chat success rates"""
+        return {'outbox': self.outbox.get_stats(), **self.stats, 'chats': self.outbox.get_chat_stats()}
@@ -0,0 +1,89 @@
+from collections import deque
+
+class PatternMatcher:
+    """Aho-Corasick automaton that finds every whole-word occurrence of many patterns in one pass
+    
+    All patterns are compiled into a single trie with failure links, so
+    scanning a text costs time proportional to its length plus the number of
+    matches, however many patterns there are. Matching is case-insensitive
+    and a match only counts if it isn't part of a longer word ("java" does
+    not match "javascript").
+    """
+    
+    def __init__(self, patterns):
+        self.patterns = []  # Pattern for each pattern ID
+        self._ids = {}
+        self.goto = [{}]  # Trie edges for each state
+        self.fail = [0]
+        self.output = [[]]  # Pattern IDs ending at each state, including via failure links
+        
+        for pattern in patterns:
+            self.add(pattern)
+        self._build()
+    
+    @staticmethod
+    def normalize(text):
+        return ' '.join(str(text or '').casefold().split())
+    
+    def pattern_id(self, pattern):
+        """Return the ID of a pattern, or None if it isn't compiled in"""
+        return self._ids.get(self.normalize(pattern))
+    
+    def add(self, pattern):
+        """Add a pattern to the trie, returning its ID (only valid before the automaton is built)"""
+        pattern = self.normalize(pattern)
+        if not pattern:
+            return None
+        if pattern in self._ids:
+            return self._ids[pattern]
+        
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        
+        pattern_id = len(self.patterns)
+        self.patterns.append(pattern)
+        self._ids[pattern] = pattern_id
+        self.output[state].append(pattern_id)
+        return pattern_id
+    
+    def _build(self):
+        """Compute failure links breadth first and fold each state's failure outputs into its own"""
+        # Children of the root fail back to the root, which their failure links already point at
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    def find(self, text):
+        """Return the set of pattern IDs that occur in text as whole words"""
+        text = self.normalize(text)
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        found = set()
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                if pattern_id in found:
+                    continue
+                start = end - len(patterns[pattern_id]) + 1
+                # Only count matches that aren't glued to a neighbouring letter or digit
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (end + 1 == len(text) or not text[end + 1].isalnum()):
+                    found.add(pattern_id)
+        return found
@@ -0,0 +1,227 @@
+import time
+import random
+import threading
+from collections import deque
+from config import (CHECK_INTERVAL, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL, POLL_TARGET_NEW_JOBS, POLL_EWMA_ALPHA,
+                    POLL_REQUEST_BUDGET, POLL_JITTER)
+from logger import logger
+
+# Values accepted for POLL_MODE
+POLL_MODES = ('fixed', 'adaptive', 'staggered')
+
+class QueryPollState:
+    """Arrival rate estimate and polling schedule for one query unit"""
+    
+    def __init__(self, unit, position, now):
+        self.unit = unit
+        self.position = position  # Index in the configured query order
+        self.rate = None  # EWMA of new jobs per second, None until two polls have been made
+        self.interval = CHECK_INTERVAL
+        self.next_due = now
+        self.last_poll = None
+        self.polls = 0
+        self.new_jobs = 0
+
+class PollScheduler:
+    """Schedules each query unit on its own interval based on how many new jobs it yields
+    
+    Every poll updates an exponentially weighted moving average of the query's
+    arrival rate (new jobs per second). The next poll is scheduled when about
+    POLL_TARGET_NEW_JOBS new jobs are expected, clamped to the min/max bounds,
+    so busy queries are polled often and quiet ones back off. An optional
+    hourly budget caps the total number of polls, favouring the most overdue.
+    """
+    
+    def __init__(self, units, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                 target_new_jobs=POLL_TARGET_NEW_JOBS, alpha=POLL_EWMA_ALPHA, hourly_budget=POLL_REQUEST_BUDGET,
+                 mode='adaptive'):
+        self.mode = mode  # 'fixed' when the check loop only uses this to track arrival rates
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.target_new_jobs = target_new_jobs
+        self.alpha = alpha
+        self.hourly_budget = hourly_budget
+        
+        now = time.monotonic()
+        self.states = {str(unit): QueryPollState(unit, position, now) for position, unit in enumerate(units)}
+        self.poll_times = deque()  # Monotonic times of polls in the last hour
+        self._lock = threading.Lock()
+    
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+    
+    def _interval_for(self, state):
+        """Seconds until enough new jobs are expected for the query to be worth polling"""
+        if state.rate is None:
+            return self._clamp(CHECK_INTERVAL)
+        if state.rate <= 0:
+            return self.max_interval
+        return self._clamp(self.target_new_jobs / state.rate)
+    
+    def _budget_remaining(self, now):
+        """Number of polls still allowed in the current hour, or None without a budget"""
+        if self.hourly_budget <= 0:
+            return None
+        while self.poll_times and now - self.poll_times[0] > 3600:
+            self.poll_times.popleft()
+        return max(0, self.hourly_budget - len(self.poll_times))
+    
+    def due_units(self, include_all=False):
+        """Return the query units due for a poll, in configured order
+        
+        Args:
+            include_all (bool): Return every unit regardless of schedule and budget,
+                                e.g. for the first run that marks existing jobs
+        """
+        with self._lock:
+            if include_all:
+                return [state.unit for state in self.states.values()]
+            
+            now = time.monotonic()
+            due = [state for state in self.states.values() if state.next_due <= now]
+            
+            remaining = self._budget_remaining(now)
+            if remaining is not None and len(due) > remaining:
+                # Spend what is left of the budget on the most overdue queries
+                due = sorted(due, key=lambda state: state.next_due)[:remaining]
+            
+            return [state.unit for state in sorted(due, key=lambda state: state.position)]
+    
+    def record_poll(self, unit, new_jobs, sample=True):
+        """Update a query's arrival rate after a poll and schedule its next one
+        
+        Args:
+            unit: The query unit that was polled
+            new_jobs (int): Number of new jobs the poll found
+            sample (bool): Whether the result reflects real arrivals (False for the first run)
+        """
+        with self._lock:
+            state = self.states.get(str(unit))
+            if state is None:
+                return
+            
+            now = time.monotonic()
+            if sample and state.last_poll is not None:
+                observed = new_jobs / max(1.0, now - state.last_poll)
+                state.rate = observed if state.rate is None else self.alpha * observed + (1 - self.alpha) * state.rate
+            
+            state.last_poll = now
+            state.polls += 1
+            state.new_jobs += new_jobs
+            state.interval = self._interval_for(state)
+            state.next_due = now + state.interval
+            self.poll_times.append(now)
+    
+    def seconds_until_next_poll(self):
+        """Seconds until the earliest query is due"""
+        with self._lock:
+            if not self.states:
+                return float(self.max_interval)
+            return max(0.0, min(state.next_due for state in self.states.values()) - time.monotonic())
+    
+    def get_stats(self):
+        """Return the scheduler state for each query"""
+        with self._lock:
+            now = time.monotonic()
+            remaining = self._budget_remaining(now)
+            return {
+                'mode': self.mode,
+                'hourly_budget': self.hourly_budget or None,
+                'budget_remaining': remaining,
+                'queries': [{
+                    'query': name,
+                    'new_jobs_per_hour': round(state.rate * 3600, 2) if state.rate is not None else None,
+                    'interval_seconds': round(state.interval),
+                    'next_poll_in': round(max(0.0, state.next_due - now)),
+                    'polls': state.polls,
+                    'new_jobs': state.new_jobs
+                } for name, state in self.states.items()]
+            }
+
+class StaggeredScheduler:
+    """Spreads query units evenly across each CHECK_INTERVAL instead of firing them in a burst
+    
+    Unit i is polled at anchor + cycle * interval + i * interval / n, plus a
+    little jitter. Slots are computed from the fixed anchor rather than from
+    when the last poll finished, so slow polls never push later runs back;
+    slots missed entirely (e.g. after a long stall) are skipped, not replayed.
+    """
+    
+    def __init__(self, units, interval=CHECK_INTERVAL, jitter=POLL_JITTER):
+        self.interval = interval
+        self.jitter = jitter
+        self.anchor = time.monotonic()
+        self.gap = interval / max(1, len(units))
+        
+        self.states = {}
+        for position, unit in enumerate(units):
+            state = QueryPollState(unit, position, self.anchor)
+            state.interval = interval
+            state.cycle = 0
+            state.next_due = self._slot_time(state)
+            self.states[str(unit)] = state
+        self._lock = threading.Lock()
+    
+    def _slot_time(self, state):
+        """Time of the unit's slot in its current cycle, with jitter"""
+        jitter = random.uniform(-self.jitter, self.jitter) * self.gap / 2
+        offset = min(self.interval, max(0.0, state.position * self.gap + jitter))
+        return self.anchor + state.cycle * self.interval + offset
+    
+    def due_units(self, include_all=False):
+        """Return the query units whose slot has come, in configured order"""
+        with self._lock:
+            now = time.monotonic()
+            return [state.unit for state in self.states.values() if include_all or state.next_due <= now]
+    
+    def record_poll(self, unit, new_jobs, sample=True):
+        """Move a query to its slot in the next cycle that is still ahead"""
+        with self._lock:
+            state = self.states.get(str(unit))
+            if state is None:
+                return
+            
+            now = time.monotonic()
+            state.last_poll = now
+            state.polls += 1
+            state.new_jobs += new_jobs
+            
+            # Advance whole cycles from the anchor so lateness never accumulates
+            current_cycle = int((now - self.anchor) // self.interval)
+            state.cycle = max(state.cycle + 1, current_cycle)
+            state.next_due = self._slot_time(state)
+            if state.next_due <= now:
+                state.cycle += 1
+                state.next_due = self._slot_time(state)
+    
+    def seconds_until_next_poll(self):
+        """Seconds until the earliest query slot"""
+        with self._lock:
+            if not self.states:
+                return float(self.interval)
+            return max(0.0, min(state.next_due for state in self.states.values()) - time.monotonic())
+    
+    def get_stats(self):
+        """Return the slot schedule for each query"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'mode': 'staggered',
+                'interval_seconds': self.interval,
+                'gap_seconds': round(self.gap, 1),
+                'queries': [{
+                    'query': name,
+                    'slot_offset': round(state.position * self.gap, 1),
+                    'next_poll_in': round(max(0.0, state.next_due - now)),
+                    'polls': state.polls,
+                    'new_jobs': state.new_jobs
+                } for name, state in self.states.items()]
+            }
+
+def create_scheduler(mode, units):
+    """Create the scheduler for a POLL_MODE value ('fixed' and 'adaptive' share the adaptive tracker)"""
+    if mode not in POLL_MODES:
+        logger.warning(f"Unknown POLL_MODE '{mode}', polling every query each CHECK_INTERVAL ('fixed')")
+    if mode == 'staggered':
+        return StaggeredScheduler(units)
+    return PollScheduler(units, mode='adaptive' if mode == 'adaptive' else 'fixed')
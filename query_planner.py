@@ -0,0 +1,65 @@
+import re
+from config import KEYWORDS_PER_QUERY, LOCATION, REMOTE_ONLY, DAYS_RECENT
+
+class QueryUnit:
+    """A single LinkedIn search that covers one or more keywords with one set of filters
+    
+    Several keywords are folded into one boolean search ("java OR qa") and
+    each result is attributed back to the keywords it matches locally.
+    """
+    
+    def __init__(self, keywords, location=LOCATION, remote_only=REMOTE_ONLY, days_recent=DAYS_RECENT):
+        self.keywords = tuple(keywords)
+        self.location = location
+        self.remote_only = remote_only
+        self.days_recent = days_recent
+        # Quote multi-word keywords so LinkedIn treats them as phrases
+        self.query = ' OR '.join(f'"{keyword}"' if ' ' in keyword and len(self.keywords) > 1 else keyword
+                                 for keyword in self.keywords)
+        self._patterns = [(keyword, re.compile(r'(?<!\w)' + re.escape(keyword) + r'(?!\w)', re.IGNORECASE))
+                          for keyword in self.keywords]
+    
+    def attribute(self, job_card):
+        """Return the keywords of this query that a parsed job card matches
+        
+        LinkedIn also matches on the job description, which the results page
+        doesn't include, so a card that matches none of the keywords on its
+        title or company is attributed to every keyword of the query.
+        """
+        if len(self.keywords) == 1:
+            return list(self.keywords)
+        
+        text = f"{job_card.get('title', '')} {job_card.get('company', '')}"
+        matched = [keyword for keyword, pattern in self._patterns if pattern.search(text)]
+        return matched or list(self.keywords)
+    
+    def has_default_filters(self):
+        """Check whether this search uses the globally configured location and filters"""
+        return (self.location, self.remote_only, self.days_recent) == (LOCATION, REMOTE_ONLY, DAYS_RECENT)
+    
+    def __str__(self):
+        if self.has_default_filters():
+            return self.query
+        remote = ', remote' if self.remote_only else ''
+        return f"{self.query} [{self.location}{remote}, {self.days_recent}d]"
+    
+    def __repr__(self):
+        return f"QueryUnit({str(self)!r})"
+
+def normalize_keywords(keywords):
+    """Strip whitespace and drop empty or duplicate keywords, keeping their order"""
+    normalized = []
+    for keyword in keywords:
+        keyword = keyword.strip()
+        if keyword and keyword not in normalized:
+            normalized.append(keyword)
+    return normalized
+
+def plan_queries(keywords, keywords_per_query=KEYWORDS_PER_QUERY, **filters):
+    """Fold keywords into as few LinkedIn searches as the configured group size allows
+    
+    Any filters (location, remote_only, days_recent) are applied to every query.
+    """
+    keywords = normalize_keywords(keywords)
+    group_size = max(1, keywords_per_query)
+    return [QueryUnit(keywords[i:i + group_size], **filters) for i in range(0, len(keywords), group_size)]
@@ -0,0 +1,164 @@
+import time
+import random
+import threading
+import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from config import (RATE_LIMIT_INITIAL_RATE, RATE_LIMIT_MIN_RATE, RATE_LIMIT_MAX_RATE, RATE_LIMIT_BURST,
+                    RATE_LIMIT_RAMP_STEP, RATE_LIMIT_MAX_BACKOFF, HTTP_MODE)
+from logger import logger
+
+# LinkedIn answers 999 instead of 429 when it wants a client to slow down
+THROTTLE_STATUS_CODES = {429, 999}
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Adaptive token bucket for a single host
+    
+    The refill rate is cut in half and requests are paused (exponential backoff
+    with jitter, or Retry-After if longer) whenever the host throttles us, then
+    ramps back up additively after each successful request.
+    """
+    
+    def __init__(self, rate=RATE_LIMIT_INITIAL_RATE, burst=RATE_LIMIT_BURST, min_rate=RATE_LIMIT_MIN_RATE,
+                 max_rate=RATE_LIMIT_MAX_RATE, ramp_step=RATE_LIMIT_RAMP_STEP, max_backoff=RATE_LIMIT_MAX_BACKOFF):
+        self.rate = rate
+        self.capacity = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_step = ramp_step
+        self.max_backoff = max_backoff
+        
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.consecutive_throttles = 0
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        """Add the tokens earned since the last update"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self):
+        """Block until a request may be sent, returning the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+    
+    def on_success(self):
+        """Slowly ramp the rate back up after a successful request"""
+        with self._lock:
+            self.consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.ramp_step)
+    
+    def on_throttle(self, retry_after=None):
+        """Halve the rate and pause requests after the host throttled us
+        
+        Returns:
+            float: Seconds until requests are allowed again
+        """
+        with self._lock:
+            self.consecutive_throttles += 1
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            
+            backoff = min(self.max_backoff, (1 / self.rate) * 2 ** (self.consecutive_throttles - 1))
+            delay = random.uniform(backoff / 2, backoff)  # Jitter so parallel workers don't retry in lockstep
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            
+            now = time.monotonic()
+            self.tokens = 0.0
+            self.updated = now
+            self.blocked_until = max(self.blocked_until, now + delay)
+            return delay
+    
+    def get_stats(self):
+        """Return the current rate and backoff state"""
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'tokens': round(self.tokens, 2),
+                'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 1),
+                'consecutive_throttles': self.consecutive_throttles,
+                'throttle_count': self.throttle_count
+            }
+
+class RateLimiter:
+    """Registry of per-host token buckets shared by every scraper worker"""
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.buckets = {}
+        self._lock = threading.Lock()
+    
+    def get_bucket(self, url):
+        """Return the token bucket for the URL's host, creating it on first use"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket()
+            return self.buckets[host]
+    
+    def acquire(self, url):
+        """Block until a request to the URL's host may be sent"""
+        if not self.enabled:
+            return 0.0
+        return self.get_bucket(url).acquire()
+    
+    def record_response(self, url, response):
+        """Feed a response back into the host's bucket
+        
+        Returns:
+            bool: True if the host throttled the request
+        """
+        if not self.enabled:
+            return response.status_code in THROTTLE_STATUS_CODES
+        
+        bucket = self.get_bucket(url)
+        if response.status_code in THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            delay = bucket.on_throttle(retry_after)
+            logger.warning(f"Throttled by {urlparse(url).netloc} (status {response.status_code}), "
+                           f"backing off {delay:.1f}s at {bucket.rate:.3f} requests/s")
+            return True
+        
+        if response.status_code < 400:
+            bucket.on_success()
+        return False
+    
+    def get_stats(self):
+        """Return the state of every host's bucket"""
+        with self._lock:
+            buckets = dict(self.buckets)
+        return {host: bucket.get_stats() for host, bucket in buckets.items()}
+
+# Shared instance so all scraper workers draw from the same per-host budget.
+# Replayed traffic never reaches the network, so it runs unthrottled at full speed.
+rate_limiter = RateLimiter(enabled=HTTP_MODE != 'replay')
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Run full JobChecker.check_jobs cycles against recorded LinkedIn and Telegram traffic.
+
+Record live traffic into the fixture archive:
+    python replay_check.py --record 3
+
+Replay it offline, deterministically and without rate limiting (for profiling and CI):
+    python replay_check.py 3
+
+Each run starts from an empty seen-jobs store so results only depend on the archive, and
+keeps all of its state files in a temporary directory. Notifications queued by each cycle
+are delivered before the next one, so the Telegram exchanges are replayed as well.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+def main(args):
+    record = '--record' in args
+    cycles = int(next((arg for arg in args if arg.isdigit()), '2'))
+    
+    # Configure the environment before any project module reads config
+    work_dir = tempfile.mkdtemp(prefix='replay_check_')
+    os.environ['HTTP_MODE'] = 'record' if record else 'replay'
+    os.environ['STORAGE_FILE'] = os.path.join(work_dir, 'seen_jobs.txt')
+    os.environ['STORAGE_DB_FILE'] = os.path.join(work_dir, 'seen_jobs.db')
+    os.environ['ENRICH_CACHE_DIR'] = os.path.join(work_dir, 'job_cache')
+    # A real start must not find the replayed jobs still waiting to be sent
+    os.environ['NOTIFY_OUTBOX_FILE'] = os.path.join(work_dir, 'notification_outbox.db')
+    os.environ['TELEGRAM_UPDATES_FILE'] = os.path.join(work_dir, 'telegram_updates.json')
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'replay')
+    
+    from http_client import http_client
+    from job_checker import JobChecker
+    
+    print(f"\n=== Running {cycles} check cycles in {http_client.mode} mode ===\n")
+    checker = JobChecker()
+    
+    try:
+        total_started = time.perf_counter()
+        for cycle in range(1, cycles + 1):
+            started = time.perf_counter()
+            new_jobs = checker.check_jobs()
+            # Drain the outbox here instead of on the delivery thread, so every run sends the same batches
+            while checker.delivery_worker.deliver_due():
+                pass
+            print(f"Cycle {cycle}: {new_jobs} new jobs in {time.perf_counter() - started:.3f}s, "
+                  f"outbox {checker.notification_outbox.get_stats()}")
+        print(f"\nTotal: {time.perf_counter() - total_started:.3f}s")
+        print(f"HTTP stats: {http_client.get_stats()}")
+    finally:
+        if checker.job_enricher:
+            checker.job_enricher.shutdown(wait=True)
+        checker.telegram_notifier.dispatcher.shutdown()
+        if record:
+            http_client.archive.save()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+"""
+Search matrix expansion and process-sharded execution.
+
+A search matrix lists keywords, locations and filter values; every
+combination becomes a QueryUnit. Example search_matrix.json:
+    
+    {
+        "keywords": ["qa", "java", "python"],
+        "locations": ["United States", "Canada"],
+        "remote_only": [true],
+        "days_recent": [1],
+        "keywords_per_query": 2
+    }
+
+Missing entries fall back to KEYWORDS, LOCATION, REMOTE_ONLY, DAYS_RECENT and
+KEYWORDS_PER_QUERY from config.
+"""
+
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from config import (KEYWORDS, LOCATION, REMOTE_ONLY, DAYS_RECENT, KEYWORDS_PER_QUERY, SEARCH_MATRIX_FILE,
+                    MAX_CONCURRENT_SEARCHES)
+from query_planner import plan_queries, normalize_keywords
+from logger import logger
+
+def load_search_matrix(path=SEARCH_MATRIX_FILE):
+    """Load the search matrix file, or build a single-combination matrix from config"""
+    matrix = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                matrix = json.load(f)
+            logger.info(f"Loaded search matrix from {path}")
+        except Exception as e:
+            logger.error(f"Error loading search matrix, using configured keywords: {e}")
+            matrix = {}
+    
+    return {
+        'keywords': normalize_keywords(matrix.get('keywords', KEYWORDS)),
+        'locations': matrix.get('locations', [LOCATION]),
+        'remote_only': matrix.get('remote_only', [REMOTE_ONLY]),
+        'days_recent': matrix.get('days_recent', [DAYS_RECENT]),
+        'keywords_per_query': matrix.get('keywords_per_query', KEYWORDS_PER_QUERY)
+    }
+
+def expand_search_matrix(matrix):
+    """Expand a search matrix into query units, one per keyword group and filter combination"""
+    units = []
+    for location, remote_only, days_recent in itertools.product(
+            matrix['locations'], matrix['remote_only'], matrix['days_recent']):
+        units.extend(plan_queries(matrix['keywords'], matrix['keywords_per_query'],
+                                  location=location, remote_only=remote_only, days_recent=days_recent))
+    return units
+
+def shard_units(units, shard_count):
+    """Split units round-robin into shards of (unit index, unit) pairs"""
+    shards = [[] for _ in range(max(1, shard_count))]
+    for index, unit in enumerate(units):
+        shards[index % len(shards)].append((index, unit))
+    return [shard for shard in shards if shard]
+
+def run_shard(shard):
+    """Run one shard of query units inside a worker process
+    
+    The worker loads its own read-only view of JobStorage (saved by the parent
+    after every cycle) so paginated and streaming searches can still stop at
+    the seen-job boundary, and it has its own HTTP pool and rate-limit budget.
+    Nothing is persisted here: jobs are returned so the parent can dedupe,
+    mark and notify them in a single merge stage.
+    
+    Returns:
+        list: (unit index, list of job dicts, seconds taken) tuples
+    """
+    from job_storage import create_job_storage
+    from linkedin_scraper import LinkedInScraper
+    
+    # A fresh view every cycle picks up the parent's latest save; close it so the worker doesn't leak its files
+    job_storage = create_job_storage()
+    scraper = LinkedInScraper(job_storage)
+    # The parent decides whether this is the first run, so always return what was found
+    scraper.first_run = False
+    
+    def fetch(item):
+        index, unit = item
+        started = time.monotonic()
+        try:
+            jobs = scraper.get_jobs(unit)
+        except Exception as e:
+            logger.error(f"Error checking {unit} jobs: {e}", exc_info=True)
+            jobs = []
+        return index, jobs, time.monotonic() - started
+    
+    max_workers = max(1, min(MAX_CONCURRENT_SEARCHES, len(shard)))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shard-fetch') as executor:
+            return list(executor.map(fetch, shard))
+    finally:
+        job_storage.close()
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import bisect
+from array import array
+from seen_set import HASH_MULTIPLIER, MASK_64, KeywordSets, bitmask_keywords
+from logger import logger
+
+# Second multiplier for double hashing in the Bloom filter
+BLOOM_MULTIPLIER = 0xC2B2AE3D27D4EB4F
+BLOOM_HASHES = 7
+
+# Archive file: magic, little-endian flag, Bloom hash count, job count, Bloom bit count (log2), keyword JSON length
+MAGIC = b'JSA2'
+# Earlier archives stored a 32-bit keyword bitmask per job instead of a keyword set ID
+BITMASK_MAGIC = b'JSA1'
+HEADER = struct.Struct('<4sBBxxQQQ')
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+class BloomFilter:
+    """Bloom filter over int64 keys, backed by any writable or read-only byte buffer"""
+    
+    def __init__(self, bits, buffer, hashes=BLOOM_HASHES):
+        self.bits = bits  # log2 of the bit count
+        self.buffer = buffer
+        self.hashes = hashes
+    
+    @staticmethod
+    def size_bits(job_count, bits_per_job):
+        """Return log2 of a power-of-two bit count giving at least bits_per_job per job"""
+        bits = 6
+        while (1 << bits) < job_count * bits_per_job:
+            bits += 1
+        return bits
+    
+    def _positions(self, key):
+        first = (key * HASH_MULTIPLIER) & MASK_64
+        step = ((key * BLOOM_MULTIPLIER) & MASK_64) | 1
+        shift = 64 - self.bits
+        for i in range(self.hashes):
+            yield ((first + i * step) & MASK_64) >> shift
+    
+    def add(self, key):
+        for position in self._positions(key):
+            self.buffer[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, key):
+        buffer = self.buffer
+        return all(buffer[position >> 3] >> (position & 7) & 1 for position in self._positions(key))
+
+class SeenArchive:
+    """Immutable, memory-mapped archive of seen jobs sorted by key
+    
+    Keys, keyword set IDs and first-seen times are stored as flat sorted arrays
+    and read straight from the mapping, so opening an archive costs the same
+    whatever its size. A Bloom filter stored in the same file answers most
+    lookups for unseen jobs without touching the key pages. Lookups that get
+    past the filter binary-search the keys.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        
+        magic, little_endian, hashes, count, bloom_bits, keywords_length = HEADER.unpack_from(view)
+        if magic not in (MAGIC, BITMASK_MAGIC):
+            raise ValueError(f"{path} is not a seen jobs archive")
+        if bool(little_endian) != (sys.byteorder == 'little'):
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        
+        offset = HEADER.size
+        keywords = view[offset:offset + keywords_length]
+        if magic == MAGIC:
+            self.keyword_sets = KeywordSets.from_json(keywords)
+            self._bitmask_keywords = None
+        else:
+            # Read as is; the next merge rewrites it with keyword sets
+            self.keyword_sets = None
+            self._bitmask_keywords = json.loads(bytes(keywords).decode('utf-8'))
+        offset = _align(offset + keywords_length)
+        self.count = count
+        self.keys = view[offset:offset + 8 * count].cast('q')
+        offset += 8 * count
+        self.set_ids = view[offset:offset + 4 * count].cast('I')
+        offset += 4 * count
+        self.times = view[offset:offset + 4 * count].cast('I')
+        offset = _align(offset + 4 * count)
+        self.bloom = BloomFilter(bloom_bits, view[offset:offset + (1 << bloom_bits) // 8], hashes)
+    
+    def __len__(self):
+        return self.count
+    
+    def _index(self, key):
+        """Return the position of a key, or None if it isn't archived"""
+        if key not in self.bloom:
+            return None
+        index = bisect.bisect_left(self.keys, key)
+        if index < self.count and self.keys[index] == key:
+            return index
+        return None
+    
+    def __contains__(self, key):
+        return self._index(key) is not None
+    
+    def get(self, key):
+        """Return the keyword set ID for a key, or None if it isn't archived"""
+        index = self._index(key)
+        return None if index is None else self.set_ids[index]
+    
+    def set_keywords(self, set_id):
+        """Return the set of keywords a set ID stands for"""
+        if self.keyword_sets is None:
+            return bitmask_keywords(set_id, self._bitmask_keywords)
+        return self.keyword_sets.keywords_of(set_id)
+    
+    def items(self):
+        """Yield (key, keyword set ID, first seen time) in key order"""
+        for index in range(self.count):
+            yield self.keys[index], self.set_ids[index], self.times[index]
+    
+    def close(self):
+        """Release the mapping (callers must be done with any lookups)"""
+        for view in (self.keys, self.set_ids, self.times, self.bloom.buffer):
+            view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Another view is still exported; the mapping is freed with it
+            pass
+        self._file.close()
+    
+    @classmethod
+    def open(cls, path):
+        """Open an archive, or return None if there is none yet"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            logger.error(f"Error opening seen jobs archive {path}: {e}")
+            return None
+    
+    @staticmethod
+    def write(path, archive, hot_items, hot_keyword_sets, cutoff, bits_per_job):
+        """Merge hot (key, set ID, seen_at) items into a new archive file and rename it over path
+        
+        Both inputs are merged in key order. A key found in both keeps its
+        archived first-seen time and the union of its keywords. Jobs first
+        seen before cutoff are dropped. hot_keyword_sets holds the keywords
+        of each hot set ID; the new archive gets its own set table, holding
+        only the sets its jobs still use.
+        
+        Returns:
+            int: Number of jobs in the new archive
+        """
+        keyword_sets = KeywordSets()
+        hot_remapped, archived_remapped = {}, {}
+        
+        def remap_hot(set_id):
+            if set_id not in hot_remapped:
+                hot_remapped[set_id] = keyword_sets.set_id(hot_keyword_sets[set_id])
+            return hot_remapped[set_id]
+        
+        def remap_archived(set_id):
+            if set_id not in archived_remapped:
+                archived_remapped[set_id] = keyword_sets.set_id(archive.set_keywords(set_id))
+            return archived_remapped[set_id]
+        
+        keys, set_ids, times = array('q'), array('I'), array('I')
+        archived = archive.items() if archive else iter(())
+        hot = iter(sorted(hot_items))
+        archived_item, hot_item = next(archived, None), next(hot, None)
+        while archived_item or hot_item:
+            if hot_item is None or (archived_item and archived_item[0] < hot_item[0]):
+                key, set_id, seen_at = archived_item[0], remap_archived(archived_item[1]), archived_item[2]
+                archived_item = next(archived, None)
+            elif archived_item is None or hot_item[0] < archived_item[0]:
+                key, set_id, seen_at = hot_item[0], remap_hot(hot_item[1]), hot_item[2]
+                hot_item = next(hot, None)
+            else:
+                set_id = keyword_sets.union(remap_archived(archived_item[1]), remap_hot(hot_item[1]))
+                key, seen_at = archived_item[0], archived_item[2]
+                archived_item, hot_item = next(archived, None), next(hot, None)
+            
+            if seen_at >= cutoff:
+                keys.append(key)
+                set_ids.append(set_id)
+                times.append(seen_at)
+        
+        bloom_bits = BloomFilter.size_bits(len(keys), bits_per_job)
+        bloom = BloomFilter(bloom_bits, bytearray((1 << bloom_bits) // 8))
+        for key in keys:
+            bloom.add(key)
+        
+        keywords_json = keyword_sets.to_json()
+        header = HEADER.pack(MAGIC, sys.byteorder == 'little', BLOOM_HASHES, len(keys), bloom_bits, len(keywords_json))
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(header + keywords_json)
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(keys.tobytes())
+            f.write(set_ids.tobytes())
+            f.write(times.tobytes())
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(bloom.buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return len(keys)
@@ -0,0 +1,274 @@
+import sys
+import json
+import struct
+import hashlib
+from array import array
+from logger import logger
+
+# Slot markers; real keys are positive LinkedIn IDs or hashed slugs below -1
+EMPTY = 0
+DELETED = -1
+
+# Fibonacci hashing spreads LinkedIn's sequential IDs across the table
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+
+# Binary snapshot: magic, little-endian flag, table bits, used, deleted, log length, keyword JSON length
+MAGIC = b'JSS3'
+# Earlier snapshots stored a 32-bit keyword bitmask per slot instead of a keyword set ID
+BITMASK_MAGIC = b'JSS2'
+HEADER = struct.Struct('<4sBBxxQQQQ')
+
+def job_key(job_id):
+    """Map a job ID string to its int64 key
+    
+    Numeric LinkedIn IDs are used as they are; anything else is hashed into
+    the negative range so it can't collide with a real ID.
+    """
+    job_id = str(job_id)
+    if job_id.isdigit() and 0 < int(job_id) < 2 ** 63:
+        return int(job_id)
+    digest = hashlib.blake2b(job_id.encode('utf-8'), digest_size=8).digest()
+    return -(int.from_bytes(digest, 'little') >> 2) - 2
+
+def bitmask_keywords(mask, keywords):
+    """Return the keywords whose bits are set in a bitmask from an earlier snapshot or archive"""
+    return {keyword for bit, keyword in enumerate(keywords) if mask >> bit & 1}
+
+class KeywordSets:
+    """Interned keyword sets, so a job stores one 4-byte set ID however many keywords there are
+    
+    Each keyword gets an ID and each distinct combination of keyword IDs a
+    set ID; ID 0 is the empty set. Jobs mostly match one keyword or a few
+    that are searched together, so the table stays small next to the jobs.
+    """
+    
+    def __init__(self, keywords=(), sets=((),)):
+        self.keywords = list(keywords)  # Keyword for each keyword ID
+        self._keyword_ids = {keyword: keyword_id for keyword_id, keyword in enumerate(self.keywords)}
+        self.sets = [tuple(keyword_ids) for keyword_ids in sets]  # Sorted keyword IDs for each set ID
+        self._set_ids = {keyword_ids: set_id for set_id, keyword_ids in enumerate(self.sets)}
+        self._unions = {}
+    
+    def __len__(self):
+        return len(self.sets)
+    
+    def _intern(self, keyword_ids):
+        keyword_ids = tuple(sorted(keyword_ids))
+        set_id = self._set_ids.get(keyword_ids)
+        if set_id is None:
+            set_id = self._set_ids[keyword_ids] = len(self.sets)
+            self.sets.append(keyword_ids)
+        return set_id
+    
+    def set_id(self, keywords):
+        """Return the set ID for a collection of keywords, assigning IDs to new ones"""
+        keyword_ids = set()
+        for keyword in keywords:
+            keyword_id = self._keyword_ids.get(keyword)
+            if keyword_id is None:
+                keyword_id = self._keyword_ids[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+            keyword_ids.add(keyword_id)
+        return self._intern(keyword_ids)
+    
+    def keywords_of(self, set_id):
+        """Return the set of keywords a set ID stands for"""
+        return {self.keywords[keyword_id] for keyword_id in self.sets[set_id]}
+    
+    def union(self, first, second):
+        """Return the set ID of the union of two sets"""
+        if first == second or not second:
+            return first
+        if not first:
+            return second
+        pair = (first, second)
+        if pair not in self._unions:
+            self._unions[pair] = self._intern(set(self.sets[first]) | set(self.sets[second]))
+        return self._unions[pair]
+    
+    def to_json(self):
+        return json.dumps({'keywords': self.keywords, 'sets': self.sets}).encode('utf-8')
+    
+    @classmethod
+    def from_json(cls, data):
+        table = json.loads(bytes(data).decode('utf-8'))
+        return cls(table['keywords'], table['sets'])
+
+class SeenSet:
+    """Open-addressing hash set of int64 job keys with a keyword set ID per key
+    
+    Slots live in flat arrays (8-byte key, 4-byte KeywordSets ID), so a job
+    costs a few dozen bytes instead of the several hundred a dict of string
+    sets takes, and the arrays are written and read back as raw bytes. An
+    insertion log of (slot, first seen time) pairs keeps first-seen order, so
+    eviction pops expired slots off its front without any lookups.
+    
+    Every live key has exactly one log entry. Keys only leave the set through
+    pop_expired, which consumes their entry, or remove, which rebuilds the log.
+    """
+    
+    def __init__(self, bits=4):
+        self.keyword_sets = KeywordSets()
+        self._allocate(bits)
+    
+    def _allocate(self, bits):
+        self.bits = bits
+        self.capacity = 1 << bits
+        self.keys = array('q', [EMPTY]) * self.capacity
+        self.set_ids = array('I', [0]) * self.capacity
+        self.log_slots = array('I')
+        self.log_times = array('I')
+        self.log_head = 0  # Log entries before this were already evicted
+        self.used = 0
+        self.deleted = 0
+    
+    def __len__(self):
+        return self.used
+    
+    def __contains__(self, key):
+        return self._find(key)[1]
+    
+    def _find(self, key):
+        """Return (slot, found): the key's slot, or the slot it would be inserted into"""
+        keys = self.keys
+        index_mask = self.capacity - 1
+        index = ((key * HASH_MULTIPLIER) & MASK_64) >> (64 - self.bits)
+        free_slot = None
+        while True:
+            slot_key = keys[index]
+            if slot_key == key:
+                return index, True
+            if slot_key == EMPTY:
+                return (index if free_slot is None else free_slot), False
+            if slot_key == DELETED and free_slot is None:
+                free_slot = index
+            index = (index + 1) & index_mask
+    
+    def keyword_set(self, keywords):
+        """Return the set ID for a collection of keywords"""
+        return self.keyword_sets.set_id(keywords)
+    
+    def set_keywords(self, set_id):
+        """Return the set of keywords a set ID stands for"""
+        return self.keyword_sets.keywords_of(set_id)
+    
+    def get(self, key):
+        """Return the keyword set ID for a key, or None if it isn't in the set"""
+        slot, found = self._find(key)
+        return self.set_ids[slot] if found else None
+    
+    def add(self, key, set_id, seen_at):
+        """Add a key or merge keywords into an existing one, returning True if the key is new"""
+        slot, found = self._find(key)
+        if found:
+            self.set_ids[slot] = self.keyword_sets.union(self.set_ids[slot], set_id)
+            return False
+        
+        if self.keys[slot] == DELETED:
+            self.deleted -= 1
+        self.keys[slot] = key
+        self.set_ids[slot] = set_id
+        self.used += 1
+        self.log_slots.append(slot)
+        self.log_times.append(int(seen_at))
+        
+        if (self.used + self.deleted) * 4 > self.capacity * 3:
+            self._rebuild(list(self.items()))
+        return True
+    
+    def pop_expired(self, cutoff):
+        """Remove keys first seen before cutoff in log order, returning how many were removed"""
+        head = self.log_head
+        while head < len(self.log_slots) and self.log_times[head] < cutoff:
+            slot = self.log_slots[head]
+            self.keys[slot] = DELETED
+            self.set_ids[slot] = 0
+            head += 1
+        
+        evicted = head - self.log_head
+        self.log_head = head
+        self.used -= evicted
+        self.deleted += evicted
+        
+        # Drop the consumed part of the log once it is the larger half
+        if self.log_head > 1024 and self.log_head * 2 > len(self.log_slots):
+            del self.log_slots[:self.log_head]
+            del self.log_times[:self.log_head]
+            self.log_head = 0
+        return evicted
+    
+    def remove(self, keys):
+        """Remove a set of keys by rebuilding the table without them"""
+        keys = set(keys)
+        if not keys:
+            return
+        self._rebuild([item for item in self.items() if item[0] not in keys])
+    
+    def items(self):
+        """Yield (key, keyword set ID, first seen time) for every key, oldest first"""
+        keys, set_ids, log_slots, log_times = self.keys, self.set_ids, self.log_slots, self.log_times
+        for position in range(self.log_head, len(log_slots)):
+            slot = log_slots[position]
+            yield keys[slot], set_ids[slot], log_times[position]
+    
+    def _rebuild(self, live):
+        """Rehash the live (key, set ID, seen_at) items into a table at most half full"""
+        bits = 4
+        while (1 << bits) < len(live) * 2:
+            bits += 1
+        self._allocate(bits)
+        for key, set_id, seen_at in live:
+            self.add(key, set_id, seen_at)
+    
+    def to_bytes(self):
+        """Serialize the table, the live part of the log and the keyword sets"""
+        keywords = self.keyword_sets.to_json()
+        log_length = len(self.log_slots) - self.log_head
+        header = HEADER.pack(MAGIC, sys.byteorder == 'little', self.bits, self.used, self.deleted,
+                             log_length, len(keywords))
+        return b''.join([header, keywords, self.keys.tobytes(), self.set_ids.tobytes(),
+                         self.log_slots[self.log_head:].tobytes(), self.log_times[self.log_head:].tobytes()])
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a set from to_bytes output without rehashing"""
+        magic, little_endian, bits, used, deleted, log_length, keywords_length = HEADER.unpack_from(data)
+        if magic not in (MAGIC, BITMASK_MAGIC):
+            raise ValueError("Not a seen set snapshot")
+        
+        seen_set = cls()
+        seen_set.bits = bits
+        seen_set.capacity = 1 << bits
+        view = memoryview(data)
+        offset = HEADER.size
+        keywords = view[offset:offset + keywords_length]
+        offset += keywords_length
+        
+        for name, typecode, count in (('keys', 'q', seen_set.capacity), ('set_ids', 'I', seen_set.capacity),
+                                      ('log_slots', 'I', log_length), ('log_times', 'I', log_length)):
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(view[offset:offset + size])
+            if bool(little_endian) != (sys.byteorder == 'little'):
+                values.byteswap()
+            setattr(seen_set, name, values)
+            offset += size
+        
+        seen_set.used = used
+        seen_set.deleted = deleted
+        if magic == MAGIC:
+            seen_set.keyword_sets = KeywordSets.from_json(keywords)
+        else:
+            seen_set._convert_bitmasks(json.loads(bytes(keywords).decode('utf-8')))
+        return seen_set
+    
+    def _convert_bitmasks(self, keywords):
+        """Replace the keyword bitmasks of an earlier snapshot with set IDs"""
+        converted = {0: 0}
+        set_ids = self.set_ids
+        for slot, mask in enumerate(set_ids):
+            if mask not in converted:
+                converted[mask] = self.keyword_set(bitmask_keywords(mask, keywords))
+            set_ids[slot] = converted[mask]
+        logger.info(f"Converted keyword bitmasks of {self.used} seen jobs to {len(self.keyword_sets)} keyword sets")
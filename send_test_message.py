@@ -1,9 +1,9 @@
-import requests
 import time
 import os
 import json
 from logger import logger
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS
+from http_client import http_client
 
 # Store the IDs of users who have already received welcome messages
 WELCOMED_USERS_FILE = "welcomed_users.json"
@@ -28,11 +28,11 @@ def save_welcomed_users(welcomed_users):
     except Exception as e:
         logger.error(f"Error saving welcomed users: {e}")
 
-def send_welcome_message(chat_id, first_name=None):
-    """Send a welcome message to a new user"""
+def welcome_message(first_name=None):
+    """Build the welcome message for a new user"""
     user_name = first_name if first_name else "there"
     
-    welcome_message = f"""👋 <b>Welcome, {user_name}!</b>
+    return f"""👋 <b>Welcome, {user_name}!</b>
 
 Thank you for connecting with the LinkedIn Job Scraper Bot!
 
@@ -47,77 +47,59 @@ You're now set up to receive job alerts based on the keywords we're tracking.
 
 If you have any questions or need help, please contact the administrator.
 """
-    
-    return send_direct_message(chat_id, welcome_message)
+
+def send_welcome_message(chat_id, first_name=None):
+    """Send a welcome message to a new user"""
+    return send_direct_message(chat_id, welcome_message(first_name))
 
 def get_bot_updates(send_welcome=False):
-    """Get updates from the Telegram bot to see recent chat IDs"""
+    """Show the chats that have interacted with the bot
+    
+    Updates are read from the offset the update consumer has reached, so
+    only updates it hasn't handled yet are downloaded. With send_welcome they
+    are handled (welcoming new /start users) and the offset moves past them.
+    """
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN is not set in environment variables")
         print("Error: TELEGRAM_BOT_TOKEN not configured.")
         return False
     
-    url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates'
+    from telegram_updates import update_consumer
     
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            updates = response.json()
-            print("\n=== Recent Bot Interactions ===\n")
-            
-            if not updates.get('result'):
-                print("No recent interactions found. Users must start a chat with your bot first.")
-                print(f"Ask users to search for @tsh_job_alert_bot on Telegram and send the message '/start'")
-                return
-            
-            print("Here are the most recent chat IDs from users who have interacted with your bot:")
-            print("Use these IDs in your TELEGRAM_CHAT_IDS environment variable.")
-            print("\nChat ID\t\tUsername/First Name")
-            print("-" * 40)
-            
-            seen_chat_ids = set()
-            welcomed_users = load_welcomed_users() if send_welcome else set()
-            new_welcomed_users = set()
-            
-            for update in updates.get('result', []):
-                if 'message' in update and 'chat' in update['message']:
-                    chat = update['message']['chat']
-                    chat_id = chat.get('id')
-                    if chat_id and chat_id not in seen_chat_ids:
-                        seen_chat_ids.add(chat_id)
-                        username = chat.get('username', 'N/A')
-                        first_name = chat.get('first_name', 'N/A')
-                        display_name = username if username != 'N/A' else first_name
-                        print(f"{chat_id}\t{display_name}")
-                        
-                        # Send welcome message to new users if requested
-                        if send_welcome and str(chat_id) not in welcomed_users:
-                            if '/start' in update['message'].get('text', ''):
-                                print(f"New user detected: {display_name} ({chat_id}). Sending welcome message...")
-                                if send_welcome_message(chat_id, first_name):
-                                    new_welcomed_users.add(str(chat_id))
-                                    print(f"Welcome message sent to {display_name} ({chat_id})")
-            
-            # Save newly welcomed users
-            if send_welcome and new_welcomed_users:
-                welcomed_users.update(new_welcomed_users)
-                save_welcomed_users(welcomed_users)
-                print(f"Sent welcome messages to {len(new_welcomed_users)} new users")
-            
-            return seen_chat_ids
+        if send_welcome:
+            handled = update_consumer.poll_once(timeout=0)
+            print(f"Handled {handled} new updates")
         else:
-            print(f"Failed to get updates. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
+            for update in update_consumer.fetch_updates(timeout=0):
+                chat = (update.get('message') or {}).get('chat')
+                if chat and chat.get('id'):
+                    update_consumer.chats.setdefault(str(chat['id']), chat.get('username') or chat.get('first_name') or 'N/A')
     except Exception as e:
         print(f"Error getting bot updates: {e}")
         return False
+    
+    print("\n=== Recent Bot Interactions ===\n")
+    if not update_consumer.chats:
+        print("No recent interactions found. Users must start a chat with your bot first.")
+        print(f"Ask users to search for @tsh_job_alert_bot on Telegram and send the message '/start'")
+        return set()
+    
+    print("Here are the chat IDs of users who have interacted with your bot:")
+    print("Use these IDs in your TELEGRAM_CHAT_IDS environment variable.")
+    print("\nChat ID\t\tUsername/First Name")
+    print("-" * 40)
+    for chat_id, display_name in update_consumer.chats.items():
+        print(f"{chat_id}\t{display_name}")
+    
+    return set(update_consumer.chats)
 
 def send_direct_message(chat_id, message_text):
     """Send a direct message to a specific chat ID for testing"""
     if not TELEGRAM_BOT_TOKEN:
         print("Error: TELEGRAM_BOT_TOKEN not configured.")
         return False
-        
+    
     url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
     
     payload = {
@@ -128,7 +110,7 @@ def send_direct_message(chat_id, message_text):
     
     try:
         print(f"Sending message to chat ID: {chat_id}...")
-        response = requests.post(url, data=payload)
+        response = http_client.post(url, data=payload)
         
         if response.status_code == 200:
             print(f"✓ Successfully sent notification to chat {chat_id}")
@@ -137,7 +119,7 @@ def send_direct_message(chat_id, message_text):
             print(f"✗ Failed to send message to {chat_id}. Status code: {response.status_code}")
             print(f"Response: {response.text}")
             return False
-            
+    
     except Exception as e:
         print(f"✗ Failed to send message to {chat_id}: {e}")
         return False
@@ -150,7 +132,7 @@ def send_test_message():
         print("Error: TELEGRAM_BOT_TOKEN not properly configured.")
         print("Please set this environment variable and try again.")
         return False
-        
+    
     # Check if we have any chat IDs
     chat_ids = []
     if TELEGRAM_CHAT_IDS and TELEGRAM_CHAT_IDS != ['']:
@@ -161,7 +143,7 @@ def send_test_message():
         chat_ids_from_updates = get_bot_updates()
         if chat_ids_from_updates:
             chat_ids = list(chat_ids_from_updates)
-        
+    
     if not chat_ids:
         print("\n=== NO VALID USERS FOUND ===")
         print("Please ensure users have initiated a conversation with your bot (@tsh_job_alert_bot).")
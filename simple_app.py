@@ -1,10 +1,11 @@
 import os
 import time
 import threading
-import requests
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify
 from bs4 import BeautifulSoup
+from http_client import http_client
+from job_storage import create_job_storage, extract_job_id
 
 # Configuration
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
@@ -17,10 +18,12 @@ app_state = {
     "start_time": datetime.now(),
     "job_count": 0,
     "last_check": None,
-    "seen_jobs": set(),
     "new_jobs_found": 0
 }
 
+# Seen jobs are shared with any other bot process using the same storage files
+job_storage = create_job_storage()
+
 # Create Flask app
 app = Flask(__name__)
 
@@ -35,7 +38,7 @@ def send_telegram_message(message):
     for chat_id in TELEGRAM_CHAT_IDS:
         payload = {'chat_id': chat_id, 'text': message, 'parse_mode': 'HTML'}
         try:
-            response = requests.post(url, data=payload)
+            response = http_client.post(url, data=payload)
             if not response.json().get('ok'):
                 print(f"Failed to send message to {chat_id}: {response.json()}")
                 success = False
@@ -52,7 +55,7 @@ def get_latest_jobs(keyword):
     headers = {'User-Agent': 'Mozilla/5.0'}
     
     try:
-        response = requests.get(search_url, headers=headers)
+        response = http_client.get(search_url, headers=headers)
         soup = BeautifulSoup(response.text, 'html.parser')
         
         jobs = []
@@ -61,8 +64,7 @@ def get_latest_jobs(keyword):
             job_link = job_card['href']
             job_id = job_link.split('/')[-1].split('?')[0]
             
-            if job_id not in app_state["seen_jobs"]:
-                app_state["seen_jobs"].add(job_id)
+            if job_storage.mark_job_seen(extract_job_id(job_id), [keyword]):
                 jobs.append({
                     "id": job_id,
                     "title": job_title,
@@ -88,6 +90,10 @@ def check_jobs():
         new_jobs = get_latest_jobs(keyword)
         all_new_jobs.extend(new_jobs)
     
+    # Drop jobs another bot process marked first
+    claimed_elsewhere = job_storage._save_seen_jobs()
+    all_new_jobs = [job for job in all_new_jobs if extract_job_id(job["id"]) not in claimed_elsewhere]
+    
     # Don't send notifications on first run to avoid spamming
     if app_state["job_count"] > 0:
         for job in all_new_jobs:
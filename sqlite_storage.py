@@ -0,0 +1,275 @@
+import os
+import time
+import sqlite3
+import datetime
+import threading
+from config import STORAGE_DB_FILE, STORAGE_FILE, STORAGE_TTL_DAYS
+from logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    slug TEXT,
+    title TEXT,
+    company TEXT,
+    location TEXT,
+    link TEXT,
+    posted_time TEXT,
+    keyword TEXT,
+    first_seen REAL NOT NULL,
+    found_at TEXT,
+    seen INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS jobs_first_seen ON jobs (first_seen);
+CREATE INDEX IF NOT EXISTS jobs_company ON jobs (company);
+CREATE TABLE IF NOT EXISTS job_keywords (
+    job_id TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (job_id, keyword)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS job_keywords_keyword ON job_keywords (keyword);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses the prepared versions
+SELECT_JOB = "SELECT 1 FROM jobs WHERE job_id = ? AND seen = 1"
+SELECT_KEYWORDS = "SELECT keyword FROM job_keywords WHERE job_id = ?"
+COUNT_JOBS = "SELECT COUNT(*) FROM jobs WHERE seen = 1"
+# A job whose seen mark expired but whose record was kept is claimed again like a new one
+INSERT_JOB = """
+INSERT INTO jobs (job_id, first_seen) VALUES (?, ?)
+ON CONFLICT (job_id) DO UPDATE SET first_seen = excluded.first_seen, seen = 1 WHERE seen = 0
+"""
+INSERT_KEYWORD = "INSERT OR IGNORE INTO job_keywords (job_id, keyword) VALUES (?, ?)"
+UPDATE_RECORD = """
+UPDATE jobs SET slug = ?, title = ?, company = ?, location = ?, link = ?, posted_time = ?, keyword = ?, found_at = ?
+WHERE job_id = ?
+"""
+SELECT_RECENT = """
+SELECT job_id, slug, title, company, location, link, posted_time, keyword, found_at
+FROM jobs WHERE title IS NOT NULL ORDER BY first_seen DESC LIMIT ?
+"""
+
+class SQLiteJobStorage:
+    """SQLite-backed seen job storage that also keeps the full record of every notified job
+    
+    Exposes the same interface as JobStorage. Marks are buffered in memory and
+    written in one transaction per check cycle by _save_seen_jobs, while
+    lookups go to the database (in WAL mode, so search worker processes can
+    read while the main process writes). Several bot processes can share one
+    database: a job is new for whichever process inserts it first, and
+    _save_seen_jobs reports the ones this process lost. Jobs first seen more than
+    STORAGE_TTL_DAYS ago are forgotten through the first_seen index; the full
+    records of notified jobs stay behind as history, only no longer marked seen.
+    """
+    
+    def __init__(self, db_file=STORAGE_DB_FILE, import_file=STORAGE_FILE, ttl_days=STORAGE_TTL_DAYS):
+        self.db_file = db_file
+        self.ttl = ttl_days * 24 * 3600
+        self._pending_jobs = {}  # job ID -> first seen time, for jobs not in the database yet
+        self._pending_keywords = {}  # job ID -> keywords matched but not in the database yet
+        self._pending_records = {}  # job ID -> job dict to store in full
+        # One connection is shared by the parallel searches, so guard it and the buffers
+        self._lock = threading.Lock()
+        # Other processes may hold the write lock for a moment, so wait for it rather than failing
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self._init_db()
+        if import_file:
+            self._import_file_storage(import_file)
+    
+    def _init_db(self):
+        """Switch to WAL mode and create the tables and indexes"""
+        try:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+            if 'seen' not in columns:
+                with self.conn:
+                    self.conn.execute("ALTER TABLE jobs ADD COLUMN seen INTEGER NOT NULL DEFAULT 1")
+            # Eviction only looks at jobs still marked seen, not the history left behind
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_seen_first_seen ON jobs (seen, first_seen)")
+            logger.info(f"Loaded {self.get_seen_count()} seen jobs from {self.db_file}")
+        except Exception as e:
+            logger.error(f"Error initializing job database: {e}")
+    
+    def _import_file_storage(self, storage_file):
+        """Import the seen jobs of the file backend the first time the database is used"""
+        if self.get_seen_count() or not os.path.exists(storage_file):
+            return
+        
+        from job_storage import JobStorage
+        file_storage = JobStorage(storage_file)
+        seen_jobs = list(file_storage.iter_jobs())
+        file_storage.close()
+        try:
+            with self._lock, self.conn:
+                self.conn.executemany(INSERT_JOB, ((job_id, seen_at) for job_id, _, seen_at in seen_jobs))
+                self.conn.executemany(INSERT_KEYWORD, ((job_id, keyword) for job_id, keywords, _ in seen_jobs
+                                                       for keyword in keywords))
+            logger.info(f"Imported {len(seen_jobs)} seen jobs from {storage_file}")
+        except Exception as e:
+            logger.error(f"Error importing seen jobs from {storage_file}: {e}")
+    
+    def _in_db(self, job_id):
+        return self.conn.execute(SELECT_JOB, (job_id,)).fetchone() is not None
+    
+    def _save_seen_jobs(self):
+        """Write the jobs, keyword matches and records buffered this cycle in one transaction
+        
+        Returns:
+            set: IDs of jobs this process marked as new that another process
+                 had already inserted; they should not be notified
+        """
+        lost = set()
+        with self._lock:
+            pending_jobs, self._pending_jobs = self._pending_jobs, {}
+            pending_keywords, self._pending_keywords = self._pending_keywords, {}
+            pending_records, self._pending_records = self._pending_records, {}
+            
+            try:
+                with self.conn:
+                    for job_id, seen_at in pending_jobs.items():
+                        if self.conn.execute(INSERT_JOB, (job_id, seen_at)).rowcount == 0:
+                            lost.add(job_id)
+                    self.conn.executemany(INSERT_KEYWORD, ((job_id, keyword) for job_id, keywords
+                                                           in pending_keywords.items() for keyword in keywords))
+                    self.conn.executemany(UPDATE_RECORD, (self._record_row(job) for job_id, job
+                                                          in pending_records.items() if job_id not in lost))
+                logger.debug(f"Saved {len(pending_jobs)} jobs and {len(pending_records)} job records to the database")
+            except Exception as e:
+                # Keep the buffers so the next cycle retries the write
+                self._pending_jobs = pending_jobs
+                self._pending_keywords = pending_keywords
+                self._pending_records = pending_records
+                logger.error(f"Error saving seen jobs: {e}")
+                return set()
+        
+        if lost:
+            logger.info(f"Skipping {len(lost)} jobs another process already marked as seen")
+        return lost
+    
+    def _record_row(self, job):
+        timestamp = job.get('timestamp')
+        return (job.get('id'), job.get('title'), job.get('company'), job.get('location'), job.get('link'),
+                job.get('posted_time'), job.get('keyword'), timestamp.isoformat() if timestamp else None,
+                job['signature'])
+    
+    def is_job_seen(self, job_id):
+        """Check if a job has been seen before"""
+        with self._lock:
+            return job_id in self._pending_jobs or self._in_db(job_id)
+    
+    def mark_job_seen(self, job_id, keywords=()):
+        """Mark a job as seen and record the keywords it matched
+        
+        Returns:
+            bool: True if the job was not seen before, so exactly one caller
+                  wins when parallel searches find the same job
+        """
+        with self._lock:
+            is_new = job_id not in self._pending_jobs and not self._in_db(job_id)
+            if is_new:
+                self._pending_jobs[job_id] = time.time()
+            self._pending_keywords.setdefault(job_id, set()).update(keywords)
+            return is_new
+    
+    def marked_this_cycle(self, job_id):
+        """Check if a job was first seen in this check cycle, i.e. by a mark not saved yet"""
+        with self._lock:
+            return job_id in self._pending_jobs
+    
+    def unmark_jobs(self, job_ids):
+        """Undo this cycle's marks of new jobs that aren't saved yet, so they are found as new again"""
+        with self._lock:
+            for job_id in job_ids:
+                if self._pending_jobs.pop(job_id, None) is not None:
+                    self._pending_keywords.pop(job_id, None)
+                    self._pending_records.pop(job_id, None)
+    
+    def record_jobs(self, jobs):
+        """Buffer the full records of new jobs so they are saved with this cycle's marks"""
+        with self._lock:
+            for job in jobs:
+                self._pending_records[job['signature']] = job
+    
+    def get_job_keywords(self, job_id):
+        """Return the set of keywords a seen job has matched"""
+        with self._lock:
+            keywords = {row[0] for row in self.conn.execute(SELECT_KEYWORDS, (job_id,))}
+            keywords.update(self._pending_keywords.get(job_id, ()))
+            return keywords
+    
+    def get_recent_jobs(self, limit):
+        """Return the most recently found job records, newest first"""
+        with self._lock:
+            rows = self.conn.execute(SELECT_RECENT, (limit,)).fetchall()
+            keywords = {}
+            for job_id, *_ in rows:
+                keywords[job_id] = sorted(row[0] for row in self.conn.execute(SELECT_KEYWORDS, (job_id,)))
+        
+        jobs = []
+        for job_id, slug, title, company, location, link, posted_time, keyword, found_at in rows:
+            jobs.append({
+                'id': slug,
+                'signature': job_id,
+                'title': title,
+                'company': company,
+                'location': location,
+                'link': link,
+                'posted_time': posted_time,
+                'keyword': keyword,
+                'keywords': keywords[job_id] or [keyword],
+                'timestamp': datetime.datetime.fromisoformat(found_at) if found_at else None
+            })
+        return jobs
+    
+    def get_seen_count(self):
+        """Return the number of seen jobs"""
+        with self._lock:
+            return self.conn.execute(COUNT_JOBS).fetchone()[0] + len(self._pending_jobs)
+    
+    def evict_expired(self):
+        """Forget jobs first seen longer ago than the TTL, returning how many were evicted
+        
+        Jobs without a record are deleted. Notified jobs keep their record for
+        get_recent_jobs and only lose their seen mark and keyword matches.
+        """
+        if self.ttl <= 0:
+            return 0
+        
+        cutoff = time.time() - self.ttl
+        try:
+            with self._lock, self.conn:
+                self.conn.execute("DELETE FROM job_keywords WHERE job_id IN "
+                                  "(SELECT job_id FROM jobs WHERE first_seen < ? AND seen = 1)", (cutoff,))
+                evicted = self.conn.execute("DELETE FROM jobs WHERE first_seen < ? AND seen = 1 AND title IS NULL",
+                                            (cutoff,)).rowcount
+                evicted += self.conn.execute("UPDATE jobs SET seen = 0 WHERE first_seen < ? AND seen = 1",
+                                             (cutoff,)).rowcount
+        except Exception as e:
+            logger.error(f"Error evicting expired jobs: {e}")
+            return 0
+        
+        if evicted:
+            logger.info(f"Evicted {evicted} jobs first seen more than {self.ttl / 86400:g} days ago")
+        return evicted
+    
+    def clear_old_jobs(self, max_jobs=1000):
+        """Clear out old jobs if we're storing too many"""
+        if self.get_seen_count() > max_jobs:
+            self._save_seen_jobs()
+            # LinkedIn IDs increase over time, so keep the highest ones
+            try:
+                with self._lock, self.conn:
+                    self.conn.execute("DELETE FROM jobs WHERE job_id NOT IN "
+                                      "(SELECT job_id FROM jobs ORDER BY CAST(job_id AS INTEGER) DESC LIMIT ?)",
+                                      (max_jobs,))
+                    self.conn.execute("DELETE FROM job_keywords WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+                logger.info(f"Cleaned job storage, keeping {max_jobs} most recent jobs")
+            except Exception as e:
+                logger.error(f"Error cleaning job storage: {e}")
+    
+    def close(self):
+        """Close the database connection (changes not saved yet are dropped)"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,130 @@
+"""
+Per-chat subscriptions and job routing.
+
+Each chat can narrow down which jobs it is sent. Example subscriptions.json:
+    
+    {
+        "123456789": {"keywords": ["python", "django"], "exclude": ["senior", "lead"]},
+        "-100200300": {"keywords": ["qa"], "locations": ["remote", "berlin"]}
+    }
+
+A job goes to a chat when a keyword occurs in its title or company (or is one
+of the search keywords it was found with), no excluded word occurs in its
+title or company, and a location occurs in its location. Leaving a list out
+means no restriction. Chats in TELEGRAM_CHAT_IDS without an entry get every
+job.
+"""
+
+import os
+import json
+from config import TELEGRAM_CHAT_IDS, SUBSCRIPTIONS_FILE
+from pattern_matcher import PatternMatcher
+from logger import logger
+
+def load_subscriptions(path=SUBSCRIPTIONS_FILE, chat_ids=TELEGRAM_CHAT_IDS):
+    """Load the subscriptions file and add an unrestricted entry for every other configured chat"""
+    subscriptions = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                subscriptions = {str(chat_id): subscription for chat_id, subscription in json.load(f).items()}
+            logger.info(f"Loaded {len(subscriptions)} subscriptions from {path}")
+        except Exception as e:
+            logger.error(f"Error loading subscriptions, sending every job to every chat: {e}")
+            subscriptions = {}
+    
+    for chat_id in chat_ids:
+        if chat_id and chat_id not in subscriptions:
+            subscriptions[chat_id] = {}
+    return subscriptions
+
+def _normalized(patterns):
+    """Return the non-empty normalized forms of a subscription's pattern list"""
+    return [pattern for pattern in map(PatternMatcher.normalize, patterns or []) if pattern]
+
+class SubscriptionRouter:
+    """Routes jobs to the chats whose subscriptions they match
+    
+    Every keyword, excluded word and location of every subscription is
+    compiled into one PatternMatcher, and each pattern knows which chats use
+    it for what. Routing a job scans its title, company and location once and
+    then only looks at the chats those matches point to, so the cost depends
+    on the job and the number of recipients rather than on how many
+    subscriptions and patterns there are.
+    """
+    
+    def __init__(self, subscriptions):
+        self.chat_ids = list(subscriptions)
+        self.chat_order = {chat_id: index for index, chat_id in enumerate(self.chat_ids)}
+        self.open_chats = set()  # Chats with neither a keyword nor a location filter
+        self.keyword_filtered = set()
+        self.keyword_chats = {}  # Normalized keyword -> chats subscribed to it
+        patterns = {}  # Pattern -> {kind: chats}; kinds are 'keywords', and 'locations' for chats without keywords
+        chat_patterns = {}  # Chat -> {'exclude': patterns, 'locations': patterns}
+        
+        for chat_id, subscription in subscriptions.items():
+            keywords, locations, excluded = (_normalized(subscription.get(kind)) for kind in ('keywords', 'locations', 'exclude'))
+            
+            if keywords:
+                self.keyword_filtered.add(chat_id)
+            elif not locations:
+                self.open_chats.add(chat_id)
+            
+            # A match leads to the chats it can qualify: keyword matches to their chats, and location
+            # matches only to chats that filter on location alone
+            for pattern in keywords:
+                patterns.setdefault(pattern, {}).setdefault('keywords', set()).add(chat_id)
+                self.keyword_chats.setdefault(pattern, set()).add(chat_id)
+            for pattern in locations:
+                chats = patterns.setdefault(pattern, {}).setdefault('locations', set())
+                if not keywords:
+                    chats.add(chat_id)
+            for pattern in excluded:
+                patterns.setdefault(pattern, {})
+            chat_patterns[chat_id] = {'exclude': excluded, 'locations': locations}
+        
+        self.matcher = PatternMatcher(patterns)
+        self.pattern_chats = [patterns[pattern] for pattern in self.matcher.patterns]
+        # The remaining filters are checked per candidate against the pattern IDs found in the job
+        self.chat_excludes = {}
+        self.chat_locations = {}
+        for chat_id, kinds in chat_patterns.items():
+            if kinds['exclude']:
+                self.chat_excludes[chat_id] = frozenset(self.matcher.pattern_id(pattern) for pattern in kinds['exclude'])
+            if kinds['locations']:
+                self.chat_locations[chat_id] = frozenset(self.matcher.pattern_id(pattern) for pattern in kinds['locations'])
+        logger.debug(f"Compiled {len(self.matcher.patterns)} patterns for {len(self.chat_ids)} subscribed chats")
+    
+    def _chats_for(self, pattern_ids, kind):
+        chats = set()
+        for pattern_id in pattern_ids:
+            chats.update(self.pattern_chats[pattern_id].get(kind, ()))
+        return chats
+    
+    def route(self, job):
+        """Return the chats that should be sent a job"""
+        # The separator keeps a multi-word pattern from matching across the title and company
+        text_matches = self.matcher.find(f"{job.get('title', '')} | {job.get('company', '')}")
+        location_matches = self.matcher.find(job.get('location', ''))
+        
+        # Only chats reached through a match (or without filters) can qualify, so the
+        # rest of the subscriptions are never looked at
+        candidates = self.open_chats | self._chats_for(text_matches, 'keywords') | \
+            self._chats_for(location_matches, 'locations')
+        for keyword in job.get('keywords', [job.get('keyword')]):
+            candidates |= self.keyword_chats.get(PatternMatcher.normalize(keyword), set())
+        
+        recipients = []
+        for chat_id in candidates:
+            excluded = self.chat_excludes.get(chat_id)
+            if excluded and not excluded.isdisjoint(text_matches):
+                continue
+            locations = self.chat_locations.get(chat_id)
+            if locations and locations.isdisjoint(location_matches):
+                continue
+            recipients.append(chat_id)
+        return sorted(recipients, key=self.chat_order.get)
+    
+    def route_jobs(self, jobs):
+        """Return job ID -> chats for a batch of jobs"""
+        return {job['signature']: self.route(job) for job in jobs}
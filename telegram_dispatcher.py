@@ -0,0 +1,231 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import (TELEGRAM_BOT_TOKEN, TELEGRAM_SEND_WORKERS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE,
+                    TELEGRAM_GROUP_RATE, TELEGRAM_MAX_RETRIES)
+from http_client import http_client
+from rate_limiter import TokenBucket, parse_retry_after
+from logger import logger
+
+# Longest pause between retries of a failed send, in seconds
+MAX_RETRY_BACKOFF = 30
+# Number of recent sends the latency figures are computed over
+LATENCY_WINDOW = 500
+
+def fixed_bucket(rate, burst=1):
+    """Return a token bucket that keeps its rate when throttled and only pauses"""
+    return TokenBucket(rate=rate, burst=burst, min_rate=rate, max_rate=rate, ramp_step=0)
+
+def telegram_retry_after(response):
+    """Return the seconds Telegram asked us to wait in a 429 response, if it said"""
+    try:
+        retry_after = response.json().get('parameters', {}).get('retry_after')
+        if retry_after is not None:
+            return float(retry_after)
+    except Exception:
+        pass
+    return parse_retry_after(response.headers.get('Retry-After'))
+
+class TelegramDispatcher:
+    """Sends Telegram API calls concurrently within the bot's global and per-chat rate limits
+    
+    Messages are queued per chat and each chat is drained by one worker at a
+    time, so a chat gets its messages in order while different chats are sent
+    to in parallel. Every send draws a token from the chat's bucket (1/s for
+    private chats, 20/min for groups) and from a global bucket shared by all
+    chats. A 429 pauses the chat for the retry_after Telegram returns; 429s,
+    5xx responses and network errors are retried with exponential backoff.
+    
+    submit() returns a Future that resolves to True once the message is
+    delivered, or False if it failed for good.
+    """
+    
+    def __init__(self, token=TELEGRAM_BOT_TOKEN, max_workers=TELEGRAM_SEND_WORKERS, global_rate=TELEGRAM_GLOBAL_RATE,
+                 chat_rate=TELEGRAM_CHAT_RATE, group_rate=TELEGRAM_GROUP_RATE, max_retries=TELEGRAM_MAX_RETRIES):
+        self.token = token
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_workers = max(1, max_workers)
+        # Replayed traffic never reaches Telegram, so it runs unthrottled at full speed
+        self.rate_limited = http_client.mode != 'replay'
+        self.global_bucket = fixed_bucket(global_rate, burst=max(1, int(global_rate)))
+        self.chat_buckets = {}
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='telegram-send')
+        
+        self.queues = {}  # chat ID -> deque of (method, payload, future, queued at)
+        self.active = set()  # Chats with a drain task scheduled or running
+        self.closed = False
+        self.generation = 0  # Bumped by start() after a shutdown, so drains left over from before it stand down
+        self._lock = threading.Lock()
+        
+        self.queued = 0
+        self.in_flight = 0
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'throttled': 0}
+        self.request_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.delivery_latencies = deque(maxlen=LATENCY_WINDOW)
+    
+    def _chat_bucket(self, chat_id):
+        """Return the token bucket for a chat (caller holds the lock)"""
+        if chat_id not in self.chat_buckets:
+            # Group and channel IDs are negative
+            rate = self.group_rate if str(chat_id).startswith('-') else self.chat_rate
+            self.chat_buckets[chat_id] = fixed_bucket(rate)
+        return self.chat_buckets[chat_id]
+    
+    def submit(self, chat_id, payload, method='sendMessage'):
+        """Queue an API call for a chat and return a Future for its outcome"""
+        future = Future()
+        with self._lock:
+            if self.closed:
+                future.set_result(False)
+                return future
+            self.queues.setdefault(chat_id, deque()).append((method, payload, future, time.monotonic()))
+            self.queued += 1
+            if chat_id not in self.active:
+                self.active.add(chat_id)
+                self.executor.submit(self._drain, chat_id, self.generation)
+        return future
+    
+    def _drain(self, chat_id, generation):
+        """Send the next message queued for a chat, then reschedule the chat if more are waiting
+        
+        Rescheduling after every message lets chats take turns on the workers
+        when there are more busy chats than workers.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            queue = self.queues.get(chat_id)
+            if not queue or self.closed:
+                self.active.discard(chat_id)
+                return
+            method, payload, future, queued_at = queue.popleft()
+            self.queued -= 1
+            self.in_flight += 1
+            bucket = self._chat_bucket(chat_id)
+        
+        try:
+            delivered = self._send(chat_id, bucket, method, payload)
+        except Exception as e:
+            logger.error(f"Error sending Telegram {method} to chat {chat_id}: {e}")
+            delivered = False
+        
+        with self._lock:
+            self.in_flight -= 1
+            self.stats['sent' if delivered else 'failed'] += 1
+            self.delivery_latencies.append(time.monotonic() - queued_at)
+            # After a shutdown and restart the chat's queue and active flag belong to the new run
+            if generation == self.generation:
+                if queue and not self.closed:
+                    self.executor.submit(self._drain, chat_id, generation)
+                else:
+                    self.active.discard(chat_id)
+        future.set_result(delivered)
+    
+    def _send(self, chat_id, bucket, method, payload):
+        """Send one API call, retrying throttled and transient failures"""
+        url = f'https://api.telegram.org/bot{self.token}/{method}'
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count('retried')
+            if self.rate_limited:
+                bucket.acquire()
+                self.global_bucket.acquire()
+            
+            started = time.monotonic()
+            try:
+                response = http_client.post(url, data=payload)
+            except Exception as e:
+                logger.warning(f"Telegram {method} to chat {chat_id} failed: {e}")
+                self._backoff(attempt)
+                continue
+            finally:
+                with self._lock:
+                    self.request_latencies.append(time.monotonic() - started)
+            
+            if response.status_code == 200:
+                bucket.on_success()
+                logger.debug(f"Successfully sent {method} to chat {chat_id}")
+                return True
+            
+            if response.status_code == 429:
+                self._count('throttled')
+                retry_after = telegram_retry_after(response)
+                delay = bucket.on_throttle(retry_after)
+                logger.warning(f"Telegram throttled chat {chat_id}, pausing it for {delay:.1f}s")
+                continue
+            
+            if response.status_code >= 500:
+                logger.warning(f"Telegram returned status code {response.status_code} for chat {chat_id}")
+                self._backoff(attempt)
+                continue
+            
+            # Other 4xx responses (blocked bot, bad chat ID, malformed HTML) won't succeed on a retry
+            logger.error(f"Failed to send message to {chat_id}. Status code: {response.status_code}, "
+                         f"Response: {response.text}")
+            return False
+        
+        logger.error(f"Giving up on Telegram {method} to chat {chat_id} after {self.max_retries + 1} attempts")
+        return False
+    
+    def _backoff(self, attempt):
+        """Sleep for an exponentially growing, jittered delay before the next attempt"""
+        if attempt < self.max_retries:
+            backoff = min(MAX_RETRY_BACKOFF, 2 ** attempt)
+            time.sleep(random.uniform(backoff / 2, backoff))
+    
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def start(self):
+        """Accept messages again after a shutdown, with a fresh worker pool"""
+        with self._lock:
+            if not self.closed:
+                return
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='telegram-send')
+            self.generation += 1
+            self.closed = False
+        logger.info("Telegram dispatcher restarted")
+    
+    def shutdown(self):
+        """Stop sending and fail the messages still queued"""
+        with self._lock:
+            self.closed = True
+            pending = [item for queue in self.queues.values() for item in queue]
+            self.queues.clear()
+            self.active.clear()
+            self.queued = 0
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for _, _, future, _ in pending:
+            future.set_result(False)
+        if pending:
+            logger.warning(f"Dropped {len(pending)} queued Telegram messages on shutdown")
+    
+    def get_stats(self):
+        """Return queue depth, send counters and latency figures"""
+        def summarize(latencies):
+            if not latencies:
+                return {'avg': None, 'p95': None}
+            ordered = sorted(latencies)
+            return {
+                'avg': round(sum(ordered) / len(ordered), 3),
+                'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)
+            }
+        
+        with self._lock:
+            return {
+                'queue_depth': self.queued,
+                'in_flight': self.in_flight,
+                'busy_chats': len(self.active),
+                **self.stats,
+                'request_latency': summarize(self.request_latencies),
+                'delivery_latency': summarize(self.delivery_latencies),
+                'global_bucket': self.global_bucket.get_stats()
+            }
+
+# Shared instance so every notifier draws from the bot's single Telegram budget
+telegram_dispatcher = TelegramDispatcher()
@@ -1,63 +1,184 @@
-import requests
-import time
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS
+import html
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_DIGEST_THRESHOLD, TELEGRAM_DIGEST_BY_KEYWORD
+from telegram_dispatcher import telegram_dispatcher
+from subscriptions import SubscriptionRouter, load_subscriptions
 from logger import logger
 
+# Telegram rejects messages longer than this many characters
+MAX_MESSAGE_LENGTH = 4096
+# Longest title, company or location shown in a digest entry, so one entry always fits in a message
+MAX_FIELD_LENGTH = 200
+
+def clean_text(text, max_length=None):
+    """Drop unencodable characters, optionally shorten, and escape text for Telegram's HTML mode"""
+    text = str(text or '').encode('utf-16', 'surrogatepass').decode('utf-16', 'ignore')
+    if max_length and len(text) > max_length:
+        text = text[:max_length - 1] + '…'
+    return html.escape(text, quote=False)
+
+def split_message(header, entries, limit=MAX_MESSAGE_LENGTH):
+    """Pack entries under a header into as few messages as fit within the length limit
+    
+    Messages are only split between entries, and every entry is complete
+    HTML on its own, so no tag is ever cut in half. Continuation messages
+    repeat the header so each one makes sense by itself.
+    
+    Returns:
+        list: (message, number of entries in it) in entry order
+    """
+    continued = f"{header} (continued)"
+    messages = []
+    current, count = header, 0
+    for entry in entries:
+        if len(current) + 2 + len(entry) > limit and count:
+            messages.append((current, count))
+            current, count = continued, 0
+        current += f"\n\n{entry}"
+        count += 1
+    messages.append((current, count))
+    return messages
+
 class TelegramNotifier:
     """Class to send job notifications to Telegram"""
     
-    def __init__(self):
+    def __init__(self, dispatcher=telegram_dispatcher, digest_threshold=TELEGRAM_DIGEST_THRESHOLD,
+                 digest_by_keyword=TELEGRAM_DIGEST_BY_KEYWORD, router=None):
+        self.dispatcher = dispatcher
+        self.router = router or SubscriptionRouter(load_subscriptions())
+        self.digest_threshold = digest_threshold
+        self.digest_by_keyword = digest_by_keyword
         if not TELEGRAM_BOT_TOKEN:
             logger.error("TELEGRAM_BOT_TOKEN is not set in environment variables")
-        if not TELEGRAM_CHAT_IDS or TELEGRAM_CHAT_IDS == ['']:
-            logger.error("TELEGRAM_CHAT_IDS is not set or is empty in environment variables")
+        if not self.router.chat_ids:
+            logger.error("TELEGRAM_CHAT_IDS is not set or is empty in environment variables, and there are no subscriptions")
     
     def format_job_message(self, job):
         """Format a job listing for Telegram message"""
-        # Clean the title to handle any encoding issues
-        clean_title = job['title'].encode('utf-16', 'surrogatepass').decode('utf-16', 'ignore')
+        keywords = '/'.join(keyword.upper() for keyword in job.get('keywords', [job['keyword']]))
         
-        message = f"🚀 <b>New {job['keyword'].upper()} Job Posted</b>\n"
-        message += f"<b>Title:</b> {clean_title}\n"
-        message += f"<b>Company:</b> {job['company']}\n"
-        message += f"<b>Location:</b> {job['location']}\n"
-        message += f"<b>Link:</b> {job['link']}"
+        message = f"🚀 <b>New {clean_text(keywords)} Job Posted</b>\n"
+        message += f"<b>Title:</b> {clean_text(job['title'])}\n"
+        message += f"<b>Company:</b> {clean_text(job['company'])}\n"
+        message += f"<b>Location:</b> {clean_text(job['location'])}\n"
+        message += f"<b>Link:</b> {clean_text(job['link'])}"
         
         return message
     
-    def send_message(self, job):
-        """Send a job notification to all configured Telegram chats"""
-        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_IDS or TELEGRAM_CHAT_IDS == ['']:
+    def format_digest_entry(self, number, job, show_keywords=True):
+        """Format one job as a short, self-contained digest entry"""
+        entry = f"<b>{number}. {clean_text(job['title'], MAX_FIELD_LENGTH)}</b>"
+        if show_keywords:
+            keywords = '/'.join(keyword.upper() for keyword in job.get('keywords', [job['keyword']]))
+            entry += f" [{clean_text(keywords, MAX_FIELD_LENGTH)}]"
+        entry += f"\n{clean_text(job['company'], MAX_FIELD_LENGTH)} · {clean_text(job['location'], MAX_FIELD_LENGTH)}"
+        entry += f"\n<a href=\"{html.escape(job['link'], quote=True)}\">View job</a>"
+        return entry
+    
+    def format_digest(self, jobs):
+        """Format a batch of jobs as digest messages of at most MAX_MESSAGE_LENGTH characters
+        
+        With digest_by_keyword each keyword gets its own messages, headed by
+        the keyword; jobs matching several keywords are listed under the one
+        they were found with.
+        
+        Returns:
+            list: (jobs listed in the message, message) pairs
+        """
+        if self.digest_by_keyword:
+            groups = {}
+            for job in jobs:
+                groups.setdefault(job['keyword'], []).append(job)
+            sections = [(f"🚀 <b>{len(group)} New {clean_text(keyword.upper())} Jobs Posted</b>", group, False)
+                        for keyword, group in groups.items()]
+        else:
+            sections = [(f"🚀 <b>{len(jobs)} New Jobs Posted</b>", jobs, True)]
+        
+        messages = []
+        for header, group, show_keywords in sections:
+            entries = [self.format_digest_entry(number, job, show_keywords) for number, job in enumerate(group, 1)]
+            start = 0
+            for message, count in split_message(header, entries):
+                messages.append((group[start:start + count], message))
+                start += count
+        return messages
+    
+    def chat_ids(self):
+        """Return the subscribed chat IDs, or an empty list if Telegram isn't configured"""
+        if not TELEGRAM_BOT_TOKEN or not self.router.chat_ids:
             logger.error("Telegram configuration is incomplete, cannot send message")
-            return False
-            
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
+            return []
+        return self.router.chat_ids
+    
+    def route_jobs(self, jobs):
+        """Return job ID -> the subscribed chats each job should go to"""
+        return self.router.route_jobs(jobs)
+    
+    def _queue_text(self, chat_id, text, disable_preview=False):
+        """Queue one HTML message for a chat, returning its Future"""
+        payload = {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'HTML'
+        }
+        if disable_preview:
+            # A digest links many jobs, and a preview of only the first one is just noise
+            payload['disable_web_page_preview'] = 'true'
+        return self.dispatcher.submit(chat_id, payload)
+    
+    def _format_batches(self, jobs):
+        """Return (jobs in the message, message, is digest) for a chat's jobs"""
+        if self.digest_threshold <= 0 or len(jobs) < self.digest_threshold:
+            return [([job], self.format_job_message(job), False) for job in jobs]
+        return [(batch_jobs, message, True) for batch_jobs, message in self.format_digest(jobs)]
+    
+    def queue_message(self, job):
+        """Queue a job notification for every subscribed chat it matches without waiting for delivery
+        
+        Returns:
+            list: One Future per chat, resolving to True once that chat has the message
+        """
+        if not self.chat_ids():
+            return []
         message = self.format_job_message(job)
+        return [self._queue_text(chat_id, message) for chat_id in self.router.route(job)]
+    
+    def queue_jobs(self, jobs, recipients=None):
+        """Queue notifications for a batch of new jobs, as a digest per chat once a chat has digest_threshold or more
+        
+        Args:
+            jobs (list): Job dictionaries to notify
+            recipients (dict): Job ID -> chat IDs to send that job to; jobs are
+                               routed by the chats' subscriptions if omitted
         
-        success_count = 0
-        for chat_id in TELEGRAM_CHAT_IDS:
-            if not chat_id:  # Skip empty chat IDs
-                continue
-                
-            payload = {
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            
-            try:
-                response = requests.post(url, data=payload)
-                
-                if response.status_code == 200:
-                    success_count += 1
-                    logger.debug(f"Successfully sent notification to chat {chat_id}")
-                else:
-                    logger.error(f"Failed to send message to {chat_id}. Status code: {response.status_code}, Response: {response.text}")
-                
-                # Add a small delay between messages to avoid hitting rate limits
-                time.sleep(0.5)
-                
-            except Exception as e:
-                logger.error(f"Failed to send message to {chat_id}: {e}")
-        
-        return success_count > 0
+        Returns:
+            list: (chat ID, jobs in the message, Future) for every message queued
+        """
+        chat_ids = self.chat_ids()
+        if not jobs or not chat_ids:
+            return []
+        
+        if recipients is None:
+            recipients = self.route_jobs(jobs)
+        
+        chat_jobs = {}
+        for job in jobs:
+            for chat_id in recipients.get(job['signature'], ()):
+                chat_jobs.setdefault(chat_id, []).append(job)
+        
+        # Chats due the same jobs get the same messages, so format each distinct batch once
+        formatted = {}
+        deliveries = []
+        for chat_id, jobs_for_chat in chat_jobs.items():
+            batch_key = tuple(job['signature'] for job in jobs_for_chat)
+            if batch_key not in formatted:
+                formatted[batch_key] = self._format_batches(jobs_for_chat)
+                if formatted[batch_key][0][2]:
+                    logger.info(f"Sending {len(jobs_for_chat)} jobs as a digest of {len(formatted[batch_key])} messages")
+            for batch_jobs, message, is_digest in formatted[batch_key]:
+                deliveries.append((chat_id, batch_jobs, self._queue_text(chat_id, message, disable_preview=is_digest)))
+        return deliveries
+    
+    def send_message(self, job):
+        """Send a job notification to its subscribed chats and wait for the result"""
+        futures = self.queue_message(job)
+        return sum(future.result() for future in futures) > 0
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import bisect
+import threading
+from config import (TELEGRAM_BOT_TOKEN, TELEGRAM_POLL_TIMEOUT, TELEGRAM_UPDATES_FILE, TELEGRAM_UPDATES_SAVE_INTERVAL,
+                    HTTP_CONNECT_TIMEOUT)
+from http_client import http_client
+from telegram_dispatcher import telegram_dispatcher
+from send_test_message import load_welcomed_users, save_welcomed_users, welcome_message
+from app_state import app_state
+from logger import logger
+
+# Longest pause after failed getUpdates calls, in seconds
+MAX_POLL_BACKOFF = 300
+# How far below the newest handled update_id handled IDs are remembered to catch redelivered updates
+RECENT_UPDATES = 10000
+
+HELP_MESSAGE = """<b>LinkedIn Job Scraper Bot</b>
+
+/start - Get a welcome message
+/status - Show when jobs were last checked
+/help - Show this message
+"""
+
+class UpdateConsumer:
+    """Long-polls Telegram for bot updates and dispatches each command once
+    
+    The offset after the last handled update_id is saved to updates_file
+    after every polled batch, so a restart picks up where the last run
+    stopped and Telegram drops everything already handled instead of sending
+    the whole backlog again. /start replies are also recorded in the welcomed
+    users list, so an update replayed after a crash before the save still
+    isn't welcomed twice.
+    
+    The same handle_update entry point serves updates pushed to a webhook,
+    where several workers may handle updates at once and out of order, so
+    the offset alone can't tell what was handled. The IDs handled within
+    RECENT_UPDATES of the newest one are saved with it as ranges (a handful,
+    as IDs are mostly consecutive). An update counts as a duplicate if it is
+    in one of those ranges or older than all of them; one that was turned
+    away or still queued when the process stopped is handled when Telegram
+    delivers it again, even after a restart. Duplicates are checked in
+    memory; the state is written at most every save_interval seconds while
+    updates keep coming, and by the webhook workers once they go idle.
+    """
+    
+    def __init__(self, token=TELEGRAM_BOT_TOKEN, updates_file=TELEGRAM_UPDATES_FILE,
+                 poll_timeout=TELEGRAM_POLL_TIMEOUT, dispatcher=telegram_dispatcher,
+                 save_interval=TELEGRAM_UPDATES_SAVE_INTERVAL):
+        self.token = token
+        self.updates_file = updates_file
+        self.save_interval = save_interval
+        self.poll_timeout = poll_timeout
+        self.dispatcher = dispatcher
+        self.offset = 0
+        self.handled_floor = 0  # Updates below this are older than the remembered ranges and count as handled
+        self.handled_ranges = []  # Sorted [first, last] update_id ranges handled since the floor
+        self.in_progress = set()  # Update IDs a worker is handling right now
+        self.chats = {}  # Chat ID -> display name of everyone who has messaged the bot
+        self.welcomed_users = None  # Loaded on first use, then kept in memory
+        self.commands = {
+            '/start': self._handle_start,
+            '/help': self._handle_help,
+            '/status': self._handle_status
+        }
+        self.stats = {'handled': 0, 'commands': 0, 'duplicates': 0, 'errors': 0}
+        self.running = False
+        self.thread = None
+        self._lock = threading.Lock()
+        self._welcome_lock = threading.Lock()
+        # Serializes writes of the state file, which happen outside _lock so handling doesn't wait on them
+        self._save_lock = threading.Lock()
+        self._dirty = False  # Handled updates not written to updates_file yet
+        self._last_save = time.monotonic()
+        self._load_state()
+    
+    def _load_state(self):
+        if not os.path.exists(self.updates_file):
+            return
+        try:
+            with open(self.updates_file, 'r') as f:
+                state = json.load(f)
+            self.offset = state.get('offset', 0)
+            # State saved before handled ranges were kept only has the offset
+            self.handled_floor = state.get('handled_floor', self.offset)
+            self.handled_ranges = state.get('handled', [])
+            self.chats = state.get('chats', {})
+            logger.debug(f"Resuming Telegram updates from offset {self.offset}")
+        except Exception as e:
+            logger.error(f"Error loading Telegram update offset: {e}")
+    
+    def save_state(self):
+        """Write the offset, handled ranges and known chats to a temp file and rename it over the old one, if they changed"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                state = {'offset': self.offset, 'handled_floor': self.handled_floor,
+                         'handled': [list(handled) for handled in self.handled_ranges], 'chats': dict(self.chats)}
+                self._dirty = False
+                self._last_save = time.monotonic()
+            
+            temp_file = f"{self.updates_file}.tmp"
+            try:
+                with open(temp_file, 'w') as f:
+                    # dumps uses the C encoder, which json.dump's chunked writes bypass
+                    f.write(json.dumps(state))
+                os.replace(temp_file, self.updates_file)
+            except Exception as e:
+                logger.error(f"Error saving Telegram update offset: {e}")
+                with self._lock:
+                    self._dirty = True
+    
+    def _save_if_due(self):
+        """Save the state once save_interval has passed since the last save, unless another thread is saving"""
+        if time.monotonic() - self._last_save < self.save_interval:
+            return
+        # A save already running may have missed this update, but _dirty stays set for the next one
+        if self._save_lock.locked():
+            return
+        self.save_state()
+    
+    def register_command(self, command, handler):
+        """Handle a bot command with handler(message, arguments)"""
+        self.commands[command] = handler
+    
+    def handle_update(self, update):
+        """Dispatch one update unless it was already handled, then advance the offset
+        
+        Returns:
+            bool: False if the update was a duplicate
+        """
+        update_id = update.get('update_id')
+        with self._lock:
+            if update_id is not None:
+                if self._was_handled(update_id) or update_id in self.in_progress:
+                    self.stats['duplicates'] += 1
+                    return False
+                # Claim the update so a concurrent redelivery is skipped, but only save it as handled once it is
+                self.in_progress.add(update_id)
+        
+        message = update.get('message') or update.get('edited_message')
+        try:
+            if message and 'chat' in message:
+                self._handle_message(message)
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error handling Telegram update {update_id}: {e}", exc_info=True)
+        
+        with self._lock:
+            self.stats['handled'] += 1
+            if update_id is not None:
+                self.in_progress.discard(update_id)
+                self._record_handled(update_id)
+                self.offset = max(self.offset, update_id + 1)
+            self._dirty = True
+        self._save_if_due()
+        return True
+    
+    def _was_handled(self, update_id):
+        """Return True if an update was handled before (caller holds the lock)"""
+        if update_id < self.handled_floor:
+            return True
+        index = bisect.bisect_right(self.handled_ranges, [update_id, float('inf')]) - 1
+        return index >= 0 and self.handled_ranges[index][1] >= update_id
+    
+    def _record_handled(self, update_id):
+        """Add an update to the handled ranges and forget the ranges too old to matter (caller holds the lock)"""
+        ranges = self.handled_ranges
+        index = bisect.bisect_right(ranges, [update_id, float('inf')])
+        before = ranges[index - 1] if index > 0 else None
+        after = ranges[index] if index < len(ranges) else None
+        if before and before[1] >= update_id:
+            return
+        if before and before[1] == update_id - 1 and after and after[0] == update_id + 1:
+            before[1] = after[1]
+            del ranges[index]
+        elif before and before[1] == update_id - 1:
+            before[1] = update_id
+        elif after and after[0] == update_id + 1:
+            after[0] = update_id
+        else:
+            ranges.insert(index, [update_id, update_id])
+        
+        while ranges and ranges[0][1] < ranges[-1][1] - RECENT_UPDATES:
+            self.handled_floor = max(self.handled_floor, ranges.pop(0)[1] + 1)
+    
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def _handle_message(self, message):
+        chat = message['chat']
+        chat_id = str(chat.get('id'))
+        name = chat.get('username') or chat.get('first_name') or chat.get('title') or 'N/A'
+        self.chats[chat_id] = name
+        
+        text = message.get('text', '')
+        if not text.startswith('/'):
+            return
+        command, _, arguments = text.partition(' ')
+        # Commands in groups may be addressed to the bot, as in /start@tsh_job_alert_bot
+        command = command.split('@', 1)[0].lower()
+        handler = self.commands.get(command)
+        if handler:
+            self._count('commands')
+            logger.info(f"Handling {command} from chat {chat_id} ({name})")
+            handler(message, arguments.strip())
+    
+    def _reply(self, chat_id, text):
+        """Send an HTML reply through the rate-limited dispatcher and wait for it"""
+        payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML'}
+        return self.dispatcher.submit(str(chat_id), payload).result()
+    
+    def _handle_start(self, message, arguments):
+        chat = message['chat']
+        chat_id = str(chat.get('id'))
+        # One welcome at a time, so two /start messages handled together can't both be welcomed
+        with self._welcome_lock:
+            if self.welcomed_users is None:
+                self.welcomed_users = load_welcomed_users()
+            if chat_id in self.welcomed_users:
+                return
+            if self._reply(chat_id, welcome_message(chat.get('first_name'))):
+                self.welcomed_users.add(chat_id)
+                save_welcomed_users(self.welcomed_users)
+                logger.info(f"Welcome message sent to {self.chats.get(chat_id)} ({chat_id})")
+    
+    def _handle_help(self, message, arguments):
+        self._reply(message['chat']['id'], HELP_MESSAGE)
+    
+    def _handle_status(self, message, arguments):
+        last_check = app_state["last_check"]
+        text = (f"<b>Status:</b> {'Online' if app_state['running'] else 'Paused'}\n"
+                f"<b>Last check:</b> {last_check.strftime('%Y-%m-%d %H:%M') if last_check else 'Never'}\n"
+                f"<b>Jobs found:</b> {app_state['jobs_found']}")
+        self._reply(message['chat']['id'], text)
+    
+    def fetch_updates(self, timeout=None):
+        """Long-poll getUpdates from the saved offset, returning the updates (empty on timeout)"""
+        timeout = self.poll_timeout if timeout is None else timeout
+        url = f'https://api.telegram.org/bot{self.token}/getUpdates'
+        params = {'offset': self.offset, 'timeout': timeout, 'allowed_updates': json.dumps(['message'])}
+        # Telegram holds the request open for up to timeout seconds, so allow for that on top of the read timeout
+        response = http_client.get(url, params=params, timeout=(HTTP_CONNECT_TIMEOUT, timeout + 10))
+        if response.status_code == 409:
+            try:
+                description = response.json().get('description', '')
+            except ValueError:
+                description = response.text
+            # A webhook is left to the app's startup to remove, so a CLI run can't take down a live one
+            if 'webhook' in description.lower():
+                raise RuntimeError(f"getUpdates is unavailable while the bot has a webhook set: {description}")
+            # Otherwise another getUpdates call for the bot is running, e.g. a CLI run next to the poller
+            raise RuntimeError(f"getUpdates conflicts with another request for this bot: {description}")
+        if response.status_code != 200:
+            raise RuntimeError(f"getUpdates returned status code {response.status_code}: {response.text}")
+        return response.json().get('result', [])
+    
+    def poll_once(self, timeout=None):
+        """Fetch and handle one batch of updates, returning how many were handled"""
+        handled = sum(self.handle_update(update) for update in self.fetch_updates(timeout))
+        # The next getUpdates call confirms the batch to Telegram, so save the offset before it
+        self.save_state()
+        return handled
+    
+    def run(self):
+        """Poll for updates until stopped, backing off while Telegram is unreachable"""
+        failures = 0
+        while self.running:
+            try:
+                self.poll_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(MAX_POLL_BACKOFF, 5 * 2 ** (failures - 1))
+                logger.error(f"Error polling Telegram updates, retrying in {delay}s: {e}")
+                time.sleep(delay)
+    
+    def start(self):
+        """Start polling in a background thread"""
+        if not self.token:
+            logger.warning("Telegram bot token not configured, update consumer not started")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='telegram-updates', daemon=True)
+        self.thread.start()
+        logger.info(f"Listening for Telegram updates from offset {self.offset}")
+    
+    def stop(self):
+        """Stop polling after the current long-poll returns"""
+        self.running = False
+        self.save_state()
+    
+    def get_stats(self):
+        return {'offset': self.offset, 'known_chats': len(self.chats), **self.stats}
+
+# Shared instance so the poller and any webhook handler advance the same offset
+update_consumer = UpdateConsumer()
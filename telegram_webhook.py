@@ -0,0 +1,159 @@
+import hmac
+import json
+import time
+import queue
+import threading
+from collections import deque
+from config import (TELEGRAM_BOT_TOKEN, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_QUEUE_SIZE,
+                    TELEGRAM_WEBHOOK_WORKERS)
+from http_client import http_client
+from telegram_updates import update_consumer
+from logger import logger
+
+# Path Telegram posts updates to, relative to TELEGRAM_WEBHOOK_URL
+WEBHOOK_PATH = '/telegram/webhook'
+# Header Telegram echoes the secret_token from setWebhook in
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Number of recent updates the queue wait figures are computed over
+LATENCY_WINDOW = 500
+
+class WebhookReceiver:
+    """Accepts updates pushed by Telegram and hands them to a bounded worker queue
+    
+    The HTTP handler only checks the secret token and enqueues the update,
+    so it answers Telegram straight away. Worker threads pass the updates
+    to the update consumer, which skips duplicates and runs the commands.
+    When the queue is full the handler answers 503 and Telegram delivers
+    the update again later, instead of the backlog growing without bound.
+    """
+    
+    def __init__(self, consumer=update_consumer, secret=TELEGRAM_WEBHOOK_SECRET, queue_size=TELEGRAM_WEBHOOK_QUEUE_SIZE,
+                 workers=TELEGRAM_WEBHOOK_WORKERS):
+        self.consumer = consumer
+        self.secret = secret
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.worker_count = max(1, workers)
+        self.threads = []
+        self.running = False
+        self._lock = threading.Lock()
+        self.stats = {'received': 0, 'processed': 0, 'rejected_secret': 0, 'rejected_full': 0, 'invalid': 0}
+        self.queue_waits = deque(maxlen=LATENCY_WINDOW)
+    
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+    
+    def check_secret(self, token):
+        """Return True if a request carries the configured secret token"""
+        if not self.secret:
+            return False
+        return hmac.compare_digest((token or '').encode('utf-8'), self.secret.encode('utf-8'))
+    
+    def receive(self, token, body):
+        """Validate and enqueue one webhook request
+        
+        Returns:
+            tuple: (HTTP status, response text) for the handler to return
+        """
+        if not self.check_secret(token):
+            self._count('rejected_secret')
+            return 403, 'forbidden'
+        try:
+            update = json.loads(body)
+        except (TypeError, ValueError):
+            self._count('invalid')
+            return 400, 'invalid update'
+        if not isinstance(update, dict):
+            self._count('invalid')
+            return 400, 'invalid update'
+        
+        try:
+            self.queue.put_nowait((update, time.monotonic()))
+        except queue.Full:
+            self._count('rejected_full')
+            return 503, 'busy'
+        self._count('received')
+        return 200, 'ok'
+    
+    def _work(self):
+        while self.running:
+            try:
+                update, queued_at = self.queue.get(timeout=1)
+            except queue.Empty:
+                # Write out what the consumer handled since its last save while there is nothing else to do
+                self.consumer.save_state()
+                continue
+            try:
+                self.consumer.handle_update(update)
+            except Exception as e:
+                logger.error(f"Error handling webhook update {update.get('update_id')}: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self.stats['processed'] += 1
+                    self.queue_waits.append(time.monotonic() - queued_at)
+                self.queue.task_done()
+    
+    def start(self):
+        """Start the worker threads"""
+        if self.running:
+            return
+        self.running = True
+        self.threads = []
+        for index in range(self.worker_count):
+            thread = threading.Thread(target=self._work, name=f'telegram-webhook-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Webhook receiver started with {self.worker_count} workers")
+    
+    def stop(self):
+        """Stop the workers once their current update is done"""
+        self.running = False
+        self.consumer.save_state()
+    
+    def set_webhook(self, base_url=TELEGRAM_WEBHOOK_URL, token=TELEGRAM_BOT_TOKEN):
+        """Point the bot at this app's webhook endpoint, returning True if Telegram accepted it"""
+        url = f'https://api.telegram.org/bot{token}/setWebhook'
+        payload = {
+            'url': base_url.rstrip('/') + WEBHOOK_PATH,
+            'secret_token': self.secret,
+            'allowed_updates': json.dumps(['message']),
+            'max_connections': self.worker_count
+        }
+        try:
+            response = http_client.post(url, data=payload)
+            if response.status_code == 200:
+                logger.info(f"Telegram webhook set to {payload['url']}")
+                return True
+            logger.error(f"Failed to set Telegram webhook. Status code: {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            logger.error(f"Failed to set Telegram webhook: {e}")
+        return False
+    
+    def delete_webhook(self, token=TELEGRAM_BOT_TOKEN):
+        """Remove any webhook left from webhook mode, which would block getUpdates, returning True on success"""
+        url = f'https://api.telegram.org/bot{token}/deleteWebhook'
+        try:
+            response = http_client.post(url)
+            if response.status_code == 200:
+                return True
+            logger.error(f"Failed to delete Telegram webhook. Status code: {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            logger.error(f"Failed to delete Telegram webhook: {e}")
+        return False
+    
+    def get_stats(self):
+        """Return queue depth, counters and how long updates waited for a worker"""
+        with self._lock:
+            waits = sorted(self.queue_waits)
+            return {
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                **self.stats,
+                'queue_wait': {
+                    'avg': round(sum(waits) / len(waits), 4) if waits else None,
+                    'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else None
+                }
+            }
+
+# Shared instance used by the Flask endpoint
+webhook_receiver = WebhookReceiver()
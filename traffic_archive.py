@@ -0,0 +1,94 @@
+import os
+import re
+import gzip
+import json
+import threading
+import requests
+from logger import logger
+
+# Telegram puts the bot token in the URL path, so it is masked before anything is stored
+BOT_TOKEN_PATTERN = re.compile(r'/bot[^/]+/')
+
+# Headers that no longer apply once the recorded body has been decoded
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+def exchange_key(method, url):
+    """Build the archive key for a request, with any bot token masked"""
+    return f"{method.upper()} {BOT_TOKEN_PATTERN.sub('/bot<token>/', url)}"
+
+class TrafficArchive:
+    """Gzip-compressed archive of recorded HTTP exchanges
+    
+    Responses are grouped by method and URL and replayed in the order they
+    were recorded; once a URL's responses run out the last one is repeated,
+    so a recording can drive any number of check cycles.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.exchanges = {}  # key -> list of recorded responses
+        self.positions = {}  # key -> index of the next response to replay
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Load recorded exchanges from the archive file"""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                self.exchanges = json.load(f)
+            logger.info(f"Loaded {sum(len(r) for r in self.exchanges.values())} recorded responses from {self.path}")
+        except FileNotFoundError:
+            logger.warning(f"No traffic archive found at {self.path}, starting empty")
+        except Exception as e:
+            logger.error(f"Error loading traffic archive: {e}")
+    
+    def save(self):
+        """Write all recorded exchanges to the archive file"""
+        try:
+            with self._lock:
+                data = json.dumps(self.exchanges)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+                f.write(data)
+            logger.info(f"Saved {sum(len(r) for r in self.exchanges.values())} recorded responses to {self.path}")
+        except Exception as e:
+            logger.error(f"Error saving traffic archive: {e}")
+    
+    def record(self, method, url, response):
+        """Add a live response to the archive"""
+        entry = {
+            'status_code': response.status_code,
+            'headers': {name: value for name, value in response.headers.items()
+                        if name.lower() not in DROPPED_HEADERS},
+            'encoding': response.encoding,
+            'body': response.text
+        }
+        with self._lock:
+            self.exchanges.setdefault(exchange_key(method, url), []).append(entry)
+    
+    def replay(self, method, url):
+        """Build a response for the request from the archive
+        
+        Raises:
+            requests.ConnectionError: If nothing was recorded for the request, so
+                callers handle it like any other failed request
+        """
+        key = exchange_key(method, url)
+        with self._lock:
+            responses = self.exchanges.get(key)
+            if not responses:
+                raise requests.ConnectionError(f"No recorded response for {key}")
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            entry = responses[min(position, len(responses) - 1)]
+        
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response.headers.update(entry['headers'])
+        response.encoding = entry['encoding'] or 'utf-8'
+        response._content = entry['body'].encode(response.encoding)
+        response._content_consumed = True  # Lets iter_content() stream the stored body
+        response.url = url
+        response.request = requests.Request(method.upper(), url).prepare()
+        return response
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the Telegram webhook endpoint.
+Stands in for Telegram by posting synthetic updates to the Flask app's
+webhook route in-process (no network, no real bot), from several client
+threads at once. A share of the updates are redeliveries of earlier ones,
+which the update consumer has to skip. Like Telegram, each client posts an
+update that was turned away while the queue was full again after a short
+pause. Reports how fast the endpoint answers, how long each request took
+and how fast the worker queue drains, then checks that every update was
+handled exactly once and that a consumer restarted from the saved state
+skips all of them.
+
+Usage:
+    python webhook_load_test.py                 (20,000 updates, 8 clients)
+    python webhook_load_test.py 100000 16
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import threading
+
+# Keep the test's offset and chats out of the real state file, and give the endpoint a secret
+STATE_DIR = tempfile.mkdtemp(prefix='webhook-load-test-')
+os.environ['TELEGRAM_UPDATES_FILE'] = os.path.join(STATE_DIR, 'telegram_updates.json')
+os.environ['TELEGRAM_WEBHOOK_SECRET'] = 'load-test-secret'
+
+from keep_alive import app
+from telegram_webhook import webhook_receiver, WEBHOOK_PATH, SECRET_HEADER
+from telegram_updates import update_consumer, UpdateConsumer
+
+DUPLICATE_SHARE = 0.05
+# Pause before posting an update the endpoint turned away again, in seconds
+RETRY_DELAY = 0.05
+
+def generate_updates(update_count, rng):
+    """Build synthetic message updates from a pool of chats, with some redelivered"""
+    updates = []
+    for update_id in range(1, update_count + 1):
+        chat_id = rng.randint(1, 5000)
+        text = rng.choice(['hello', 'any new qa jobs?', '/ping', 'thanks!'])
+        updates.append({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': f"User{chat_id}"}}})
+    redelivered = rng.sample(updates, int(update_count * DUPLICATE_SHARE))
+    return [json.dumps(update) for update in updates + redelivered]
+
+def post_updates(bodies, latencies, statuses):
+    """Post each update, posting it again after a pause for as long as the endpoint answers 503"""
+    client = app.test_client()
+    for body in bodies:
+        while True:
+            started = time.perf_counter()
+            response = client.post(WEBHOOK_PATH, data=body, content_type='application/json',
+                                   headers={SECRET_HEADER: 'load-test-secret'})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code != 503:
+                break
+            time.sleep(RETRY_DELAY)
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+def main(update_count=20000, client_count=8):
+    bodies = generate_updates(update_count, random.Random(42))
+    webhook_receiver.start()
+    
+    # An update without the secret must be turned away
+    forbidden = app.test_client().post(WEBHOOK_PATH, data=bodies[0], headers={SECRET_HEADER: 'wrong'})
+    if forbidden.status_code != 403:
+        print(f"✗ Request with the wrong secret got status {forbidden.status_code}")
+        return 1
+    
+    latencies, statuses = [], {}
+    shares = [bodies[index::client_count] for index in range(client_count)]
+    threads = [threading.Thread(target=post_updates, args=(share, latencies, statuses)) for share in shares]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    post_time = time.perf_counter() - started
+    
+    webhook_receiver.queue.join()
+    drain_time = time.perf_counter() - started
+    stats = webhook_receiver.get_stats()
+    consumer_stats = update_consumer.get_stats()
+    
+    print(f"Posted {len(bodies)} updates ({update_count} unique) from {client_count} clients")
+    print(f"Statuses: {statuses}")
+    print(f"Answered {len(latencies) / post_time:,.0f} requests/s, "
+          f"request latency p50 {percentile(latencies, 0.5) * 1000:.2f}ms, p95 {percentile(latencies, 0.95) * 1000:.2f}ms")
+    print(f"Handled at {stats['processed'] / drain_time:,.0f} updates/s, "
+          f"queue wait p95 {stats['queue_wait']['p95']}s, {stats['rejected_full']} turned away while the queue was full")
+    print(f"Consumer: {consumer_stats['handled']} handled, {consumer_stats['duplicates']} duplicates skipped, "
+          f"offset {consumer_stats['offset']}")
+    
+    # Every update, including those accepted only after being turned away, must be handled once
+    if consumer_stats['handled'] != update_count:
+        print(f"✗ {consumer_stats['handled']} updates were handled instead of {update_count}")
+        return 1
+    
+    # After a restart, whatever Telegram delivers again must be recognized as handled
+    webhook_receiver.stop()
+    restarted = UpdateConsumer()
+    handled_again = sum(restarted.handle_update(json.loads(body)) for body in bodies[:update_count])
+    if handled_again:
+        print(f"✗ {handled_again} updates were handled again after a restart")
+        return 1
+    print(f"Restarted consumer skipped all {update_count} updates ({len(restarted.handled_ranges)} handled ranges saved)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))